@@ -14,6 +14,10 @@ class Config:
     APP_ROOT = os.path.dirname(os.path.abspath(__file__))
     UPLOAD_FOLDER = os.path.join(APP_ROOT, 'uploads')
     OUTPUT_FOLDER = os.path.join(APP_ROOT, 'outputs')
+    INDEX_FOLDER = os.path.join(APP_ROOT, 'indexes')
+    PROXY_FOLDER = os.path.join(APP_ROOT, 'proxies')
+    FRAME_CACHE_FOLDER = os.path.join(APP_ROOT, 'frame_cache')
+    PREVIEW_STORE_FOLDER = os.path.join(APP_ROOT, 'previews')
     SHELVE_FILE = os.path.join(APP_ROOT, 'video_data.db')
     
     # 檔案限制
@@ -22,23 +26,83 @@ class Config:
     
     # API 設定
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
     
     # 影片處理設定
     MAX_FRAMES_FOR_ANALYSIS = 90
     DEFAULT_JPEG_QUALITY = 75
     DEFAULT_PREVIEW_MAX_WIDTH = 300
     DEFAULT_CROP_PREVIEW_MAX_WIDTH = 250
+    SUBJECT_BOX_SIZE = 200  # 主體縮圖裁切框大小
+    THUMBNAIL_ENCODE_WORKERS = 4  # 主體縮圖平行編碼執行緒數
+    
+    # 解碼器工作階段池設定
+    DECODER_POOL_MAX_SESSIONS = 8      # 閒置 capture 數量上限
+    DECODER_POOL_MAX_MEMORY_MB = 512   # 閒置 capture 估計記憶體上限
+    DECODER_BUFFER_FRAMES = 6          # 每個解碼器估計保留的幀緩衝數
+    
+    # 幀存取規劃設定
+    ESTIMATED_GOP_SECONDS = 2.0        # 無關鍵幀索引時假設的 GOP 長度
+    SEEK_COST_FRAMES = 12              # 一次 seek 的成本（以解碼幀數計）
+    FAST_ACCESS_TOLERANCE = 0.5        # 快速模式可接受的偏移（GOP 長度的倍數）
+    SEEK_INDEX_TIMEOUT_SECONDS = 120   # 建立關鍵幀索引的逾時
+    
+    # 代理影片設定（預覽與分析使用，最終輸出仍使用原始影片）
+    PROXY_WIDTH = 640                  # 代理影片寬度 (px)
+    PROXY_JPEG_QUALITY = 85            # 代理影片 MJPEG 品質
+    FRAME_CACHE_MAX_MB = 512           # 預覽幀快取（memmap）總容量上限
+    PREVIEW_STORE_MAX_MB = 256         # 預覽資源儲存區總容量上限（超過時依最後使用時間回收）
+    PREVIEW_ASSET_MAX_AGE = 31536000   # 預覽資源（內容雜湊命名）的瀏覽器快取秒數
+    PREVIEW_IMAGE_FORMATS = ['image/avif', 'image/webp', 'image/jpeg']  # 依 Accept 標頭協商的預覽圖格式（偏好順序）
+    PREVIEW_IMAGE_QUALITY = {          # 各端點預覽圖品質（JPEG/WebP/AVIF 共用 0-100）
+        "thumbnail": 80,
+        "template_preview": 80,
+        "original_preview": 85,
+        "converted_preview": 85,
+        "crop_preview": 85,
+        "timeline_strip": 75
+    }
+    PREVIEW_SAFE_AREA_MARGIN = 0.05    # 預覽安全區域參考線的邊距（佔寬高比例）
+    TIMELINE_STRIP_COUNT = 100         # 時間軸縮圖預設數量
+    TIMELINE_STRIP_MAX_COUNT = 400     # 時間軸縮圖數量上限
+    TIMELINE_THUMB_WIDTH = 96          # 時間軸縮圖寬度 (px)
+    TIMELINE_STRIP_COLUMNS = 20        # 時間軸 sprite sheet 每列縮圖數
+    
+    # 主體追蹤設定
+    TRACKING_MAX_WIDTH = 320       # 追蹤時的降採樣寬度
+    TRACKING_FRAME_STEP = 2        # 每隔幾幀進行一次匹配，其餘幀線性插值
+    TRACKING_SEARCH_MARGIN = 1.5   # 搜尋範圍（相對於模板大小的倍數）
+    TRACKING_MIN_SCORE = 0.5       # 低於此匹配分數時改搜尋整張幀，仍不足則保持上一位置
+    TRACKING_BACKWARD_CHUNK = 120  # 往前追蹤時每段讀取的取樣幀數
+    TRACKING_SMOOTH_WINDOW = 9     # 軌跡平滑視窗（幀）
+    
+    # 場景偵測設定
+    SCENE_DETECTION_SIZE = (64, 36)   # 直方圖計算用的縮圖尺寸
+    SCENE_DETECTION_FRAME_STEP = 2    # 每隔幾幀比較一次
+    SCENE_CUT_THRESHOLD = 0.45        # Bhattacharyya 距離門檻
+    MIN_SCENE_DURATION = 0.5          # 最短場景長度（秒）
+    
+    # 本地顯著性分析設定（LLM 備援）
+    SALIENCY_NUM_FRAMES = 3
+    SALIENCY_MAP_SIZE = (64, 64)       # 頻譜殘差法的工作解析度
+    SALIENCY_THRESHOLD_FACTOR = 3.0    # 顯著區域門檻（平均值倍數）
+    SALIENCY_MAX_SUBJECTS = 3
+    
+    # 多主體裁切位置搜尋設定
+    PLACEMENT_GRID_STEPS = 65          # 每個軸向的均勻候選位置數
     
     # DOOH 模板
     DOOH_TEMPLATES = [
-        {"name": "高雄版位", "width": 3840, "height": 1526, "description": "高雄LED看板專用尺寸"},
-        {"name": "忠孝商圈", "width": 1440, "height": 960, "description": "忠孝商圈數位看板"},
-        {"name": "標準16:9", "width": 1920, "height": 1080, "description": "標準Full HD尺寸"},
-        {"name": "4K橫屏", "width": 3840, "height": 2160, "description": "4K Ultra HD橫屏"},
-        {"name": "豎屏9:16", "width": 1080, "height": 1920, "description": "手機豎屏比例"},
-        {"name": "方形1:1", "width": 1080, "height": 1080, "description": "正方形顯示"},
-        {"name": "超寬屏", "width": 2560, "height": 1080, "description": "21:9超寬屏幕"}
+        {"id": "kaohsiung", "name": "高雄版位", "width": 3840, "height": 1526, "description": "高雄LED看板專用尺寸"},
+        {"id": "zhongxiao", "name": "忠孝商圈", "width": 1440, "height": 960, "description": "忠孝商圈數位看板"},
+        {"id": "fhd-16x9", "name": "標準16:9", "width": 1920, "height": 1080, "description": "標準Full HD尺寸"},
+        {"id": "uhd-4k", "name": "4K橫屏", "width": 3840, "height": 2160, "description": "4K Ultra HD橫屏"},
+        {"id": "portrait-9x16", "name": "豎屏9:16", "width": 1080, "height": 1920, "description": "手機豎屏比例"},
+        {"id": "square-1x1", "name": "方形1:1", "width": 1080, "height": 1080, "description": "正方形顯示"},
+        {"id": "ultrawide-21x9", "name": "超寬屏", "width": 2560, "height": 1080, "description": "21:9超寬屏幕"}
     ]
+    TEMPLATES_FILE = os.path.join(APP_ROOT, 'dooh_templates.json')                # 存在時取代上方的內建模板
+    TENANT_TEMPLATES_FILE = os.path.join(APP_ROOT, 'tenant_templates.json')       # 租戶自訂模板
     
     # Flask 設定
     DEBUG = True
@@ -50,6 +114,10 @@ class Config:
         """初始化必要的目錄"""
         os.makedirs(cls.UPLOAD_FOLDER, exist_ok=True)
         os.makedirs(cls.OUTPUT_FOLDER, exist_ok=True)
+        os.makedirs(cls.INDEX_FOLDER, exist_ok=True)
+        os.makedirs(cls.PROXY_FOLDER, exist_ok=True)
+        os.makedirs(cls.FRAME_CACHE_FOLDER, exist_ok=True)
+        os.makedirs(cls.PREVIEW_STORE_FOLDER, exist_ok=True)
 
 # 全域配置實例
 config = Config()
\ No newline at end of file
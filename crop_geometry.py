@@ -0,0 +1,131 @@
+"""
+AdaptVideo 裁切幾何規劃模組（只做數值計算，不處理像素）
+"""
+import numpy as np
+
+def _as_sizes(templates):
+    """模板列表（dict 或 (寬, 高)）轉為 (T, 2) 陣列"""
+    return np.array([
+        [t['width'], t['height']] if isinstance(t, dict) else list(t)[:2]
+        for t in templates
+    ], dtype=np.float64).reshape(-1, 2)
+
+def crop_scale(original_width, original_height, target_width, target_height):
+    """等比例縮放至完全覆蓋模板所需的比例"""
+    return max(target_width / original_width, target_height / original_height)
+
+def source_crop_size(original_width, original_height, target_width, target_height):
+    """模板在原始座標中對應的裁切尺寸 (寬, 高)"""
+    scale = crop_scale(original_width, original_height, target_width, target_height)
+    return min(original_width, target_width / scale), min(original_height, target_height / scale)
+
+def plan_crops(original_width, original_height, templates, centers, scaled_sizes=None):
+    """
+    一次計算多個中心點 × 多個模板的裁切幾何：先等比例放大至覆蓋模板，再把中心點限制在畫面內
+
+    Args:
+        templates: 模板列表（dict 含 width/height，或 (寬, 高)），共 T 個
+        centers: 原始座標的中心點 (C, 2)
+        scaled_sizes: 實際縮放後的畫面尺寸 (T, 2)（例如 MoviePy 取整後的尺寸），預設為 原始尺寸 × 比例
+
+    Returns:
+        dict:
+            "scale": (T,) 縮放比例
+            "scaled_size": (T, 2) 縮放後畫面尺寸
+            "source_rects": (C, T, 4) 原始座標的裁切區域 (x1, y1, x2, y2)
+            "target_rects": (C, T, 4) 縮放後畫面中的裁切區域 (x1, y1, x2, y2)
+            "offset": (C, T, 2) 中心點被移動的距離（縮放後座標）
+            "is_adjusted": (C, T) 中心點是否被移動超過 1px
+            "coverage": (T, 2) 裁切區域佔縮放後畫面的寬、高百分比
+    """
+    sizes = _as_sizes(templates)
+    original = np.array([original_width, original_height], dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+
+    scale = (sizes / original).max(axis=1)
+    if scaled_sizes is None:
+        scaled = original * scale[:, None]
+    else:
+        scaled = np.asarray(scaled_sizes, dtype=np.float64).reshape(-1, 2)
+
+    # 在縮放後座標中把中心點限制在安全範圍內 (C, T, 2)
+    half = sizes / 2
+    desired = centers[:, None, :] * scale[None, :, None]
+    final = np.clip(desired, half, np.maximum(half, scaled - half))
+    offset = np.abs(final - desired)
+    target_rects = np.concatenate([final - half, final + half], axis=2)
+
+    return {
+        "scale": scale,
+        "scaled_size": scaled,
+        "source_rects": target_rects / scale[None, :, None],
+        "target_rects": target_rects,
+        "offset": offset,
+        "is_adjusted": (offset > 1).any(axis=2),
+        "coverage": np.minimum(1.0, sizes / scaled) * 100
+    }
+
+def _feasibility_entry(offset, coverage, scale):
+    """單一中心點 × 模板的可行性指標（與 /api/smart_crop_analysis 回應相同）"""
+    offset_x, offset_y = offset
+    is_perfect_fit = bool(offset_x < 1 and offset_y < 1)
+    return {
+        "is_perfect_fit": is_perfect_fit,
+        "offset_x": round(float(offset_x), 1),
+        "offset_y": round(float(offset_y), 1),
+        "coverage_x": round(float(coverage[0]), 1),
+        "coverage_y": round(float(coverage[1]), 1),
+        "scale_factor": round(float(scale), 2),
+        "recommendation": "完美適配" if is_perfect_fit else "需要調整" if (offset_x > 10 or offset_y > 10) else "良好適配"
+    }
+
+def analyze_crop_feasibility(original_width, original_height, templates, center):
+    """
+    計算多個模板在同一中心點下的裁切區域與可行性指標
+
+    Returns:
+        list: 與 templates 對應，每項為 {"crop_rect": 原始座標 (x1, y1, x2, y2), "is_adjusted": bool, "analysis": 可行性指標}
+    """
+    plan = plan_crops(original_width, original_height, templates, [list(center)[:2]])
+    return [
+        {
+            "crop_rect": tuple(plan['source_rects'][0, i].tolist()),
+            "is_adjusted": bool(plan['is_adjusted'][0, i]),
+            "analysis": _feasibility_entry(plan['offset'][0, i], plan['coverage'][i], plan['scale'][i])
+        }
+        for i in range(len(plan['scale']))
+    ]
+
+def feasibility_matrix(original_width, original_height, templates, centers):
+    """
+    一次計算所有中心點 × 所有模板的可行性指標
+
+    Returns:
+        list: 與 centers 對應，每項為 {模板 id: {**可行性指標, "is_adjusted": bool}}
+    """
+    if not centers or not templates:
+        return [{} for _ in centers or []]
+    plan = plan_crops(original_width, original_height, templates, [list(c)[:2] for c in centers])
+    return [
+        {
+            template['id']: {
+                **_feasibility_entry(plan['offset'][c, t], plan['coverage'][t], plan['scale'][t]),
+                "is_adjusted": bool(plan['is_adjusted'][c, t])
+            }
+            for t, template in enumerate(templates)
+        }
+        for c in range(len(centers))
+    ]
+
+def compute_crop_rect(original_width, original_height, target_width, target_height, center):
+    """單一模板與中心點的裁切區域，返回 (原始座標 (x1, y1, x2, y2), 是否被調整)"""
+    plan = plan_crops(original_width, original_height, [(target_width, target_height)], [list(center)[:2]])
+    return tuple(plan['source_rects'][0, 0].tolist()), bool(plan['is_adjusted'][0, 0])
+
+def compute_dynamic_crop_offsets(center_track, original_width, original_height, target_width, target_height, resized_size=None):
+    """將每幀中心點（原始座標）轉換為縮放後畫面中的裁切左上角座標陣列 (N, 2)"""
+    plan = plan_crops(
+        original_width, original_height, [(target_width, target_height)], center_track,
+        scaled_sizes=None if resized_size is None else [resized_size]
+    )
+    return plan['target_rects'][:, 0, :2].round().astype(np.int64)
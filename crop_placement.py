@@ -0,0 +1,93 @@
+"""
+AdaptVideo 多主體裁切位置搜尋模組
+"""
+import numpy as np
+from config import config
+from utils import subject_box_from_center, get_subject_weight
+from crop_geometry import source_crop_size
+from template_registry import get_templates
+
+def _candidate_offsets(boxes_lo, boxes_hi, window, limit, grid_steps):
+    """產生一個軸向上的候選裁切起點：主體框對齊位置加上均勻網格"""
+    if limit <= 0:
+        return np.zeros(1)
+    candidates = np.concatenate([
+        boxes_lo,                      # 框左/上緣對齊裁切起點
+        boxes_hi - window,             # 框右/下緣對齊裁切終點
+        np.linspace(0, limit, grid_steps)
+    ])
+    return np.unique(np.clip(candidates, 0, limit))
+
+def find_best_crop_placement(subjects, video_width, video_height, target_width, target_height):
+    """搜尋能最大化高重要性主體框覆蓋率的裁切位置（原始座標）"""
+    if not subjects or video_width <= 0 or video_height <= 0:
+        return None
+
+    crop_w, crop_h = source_crop_size(video_width, video_height, target_width, target_height)
+
+    boxes = np.asarray([s['box'] for s in subjects], dtype=np.float64)
+    weights = np.asarray([s['weight'] for s in subjects], dtype=np.float64)
+    areas = np.maximum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), 1.0)
+
+    grid_steps = config.PLACEMENT_GRID_STEPS
+    xs = _candidate_offsets(boxes[:, 0], boxes[:, 2], crop_w, video_width - crop_w, grid_steps)
+    ys = _candidate_offsets(boxes[:, 1], boxes[:, 3], crop_h, video_height - crop_h, grid_steps)
+    cand_x, cand_y = [a.ravel() for a in np.meshgrid(xs, ys)]
+
+    # 候選位置 × 主體框的交集面積 (C, B)
+    inter_w = np.clip(
+        np.minimum(cand_x[:, None] + crop_w, boxes[None, :, 2]) - np.maximum(cand_x[:, None], boxes[None, :, 0]),
+        0, None
+    )
+    inter_h = np.clip(
+        np.minimum(cand_y[:, None] + crop_h, boxes[None, :, 3]) - np.maximum(cand_y[:, None], boxes[None, :, 1]),
+        0, None
+    )
+    coverage = inter_w * inter_h / areas[None, :]
+    fully_kept = coverage >= 0.999
+
+    # 分數：加權覆蓋率，完整保留的主體額外加分；同分時偏好靠近加權中心
+    score = (coverage * weights).sum(axis=1) + (fully_kept * weights).sum(axis=1) * 0.5
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    weighted_center = (centers * weights[:, None]).sum(axis=0) / max(weights.sum(), 1e-8)
+    distance = np.hypot(cand_x + crop_w / 2 - weighted_center[0], cand_y + crop_h / 2 - weighted_center[1])
+    score = score - distance / (np.hypot(video_width, video_height) * 1000)
+
+    best = int(np.argmax(score))
+    x1, y1 = float(cand_x[best]), float(cand_y[best])
+    return {
+        "center": [round(x1 + crop_w / 2, 1), round(y1 + crop_h / 2, 1)],
+        "crop_box": [round(x1, 1), round(y1, 1), round(x1 + crop_w, 1), round(y1 + crop_h, 1)],
+        "fully_kept": [s.get('subject') for s, kept in zip(subjects, fully_kept[best]) if kept],
+        "cut_off": [s.get('subject') for s, kept in zip(subjects, fully_kept[best]) if not kept],
+        "coverage": [round(float(c), 3) for c in coverage[best]],
+        "score": round(float(score[best]), 3)
+    }
+
+def build_subjects(selected_centers, analysis_options, video_width, video_height):
+    """將選中的中心點對應到 LLM 分析選項，補上主體框與權重"""
+    subjects = []
+    for center in selected_centers:
+        option = next((o for o in analysis_options if o.get('center') == center), {})
+        box = option.get('box') or subject_box_from_center(center, video_width, video_height)
+        weight, _, _ = get_subject_weight(center, analysis_options)
+        subjects.append({
+            "subject": option.get('subject', f"{center[0]},{center[1]}"),
+            "center": list(center),
+            "box": list(box),
+            "weight": weight
+        })
+    return subjects
+
+def evaluate_placement_for_templates(subjects, video_width, video_height, templates=None):
+    """對每個模板計算多主體最佳裁切位置"""
+    if templates is None:
+        templates = get_templates()
+    results = []
+    for template in templates:
+        placement = find_best_crop_placement(
+            subjects, video_width, video_height, template['width'], template['height']
+        )
+        if placement:
+            results.append({"template_id": template.get('id'), "template_name": template['name'], **placement})
+    return results
@@ -6,19 +6,21 @@ from contextlib import closing
 from datetime import datetime
 from config import config
 from utils import calculate_multi_subject_center
+from crop_placement import build_subjects, find_best_crop_placement
 
 def get_video_data(file_id):
     """從資料庫獲取影片資料"""
     with closing(shelve.open(config.SHELVE_FILE)) as db:
         return db.get(file_id)
 
-def update_video_data(file_id, data):
-    """更新資料庫中的影片資料"""
+def update_video_data(file_id, data, touch=True):
+    """更新資料庫中的影片資料；touch 為 False 時不更新時間戳（不影響影片列表排序）"""
     with closing(shelve.open(config.SHELVE_FILE, writeback=True)) as db:
         if file_id not in db:
             db[file_id] = {}
         db[file_id].update(data)
-        db[file_id]['timestamp'] = datetime.now().isoformat()
+        if touch:
+            db[file_id]['timestamp'] = datetime.now().isoformat()
 
 def save_video_data(file_id, data):
     """保存新的影片資料到資料庫"""
@@ -39,6 +41,7 @@ def get_all_videos():
                     "file_id": key,
                     "filename": video_data.get('original_filename', ''),
                     "thumbnail": video_data.get('thumbnail_b64'),
+                    "thumbnail_url": video_data.get('thumbnail_url'),
                     "video_info": video_data.get('video_info'),
                     "converted_videos": video_data.get('converted_videos', [])
                 })
@@ -82,6 +85,37 @@ def calculate_multi_subject_center_backend(selected_centers, file_id):
     analysis_options = video_data.get('llm_analysis_options', [])
     return calculate_multi_subject_center(selected_centers, analysis_options)
 
+def save_timeline_strip(file_id, key, strip):
+    """保存時間軸縮圖（sprite sheet URL 與版面），以參數字串 key 區分"""
+    video_data = get_video_data(file_id) or {}
+    strips = dict(video_data.get('timeline_strips', {}))
+    strips[key] = strip
+    # 快取縮圖不算影片更新，不改變影片列表排序
+    update_video_data(file_id, {'timeline_strips': strips}, touch=False)
+
+def get_timeline_strip(file_id, key):
+    """獲取已建立的時間軸縮圖，尚未建立時返回 None"""
+    video_data = get_video_data(file_id)
+    if video_data:
+        return video_data.get('timeline_strips', {}).get(key)
+    return None
+
+def calculate_multi_subject_cover_center(selected_centers, file_id, target_width, target_height):
+    """計算能最大化主體框覆蓋率的裁切中心點（後端版本）"""
+    video_data = get_video_data(file_id)
+    if not video_data:
+        return None
+    
+    video_info = video_data.get('video_info', {})
+    width, height = video_info.get('width', 0), video_info.get('height', 0)
+    subjects = build_subjects(selected_centers, video_data.get('llm_analysis_options', []), width, height)
+    placement = find_best_crop_placement(subjects, width, height, target_width, target_height)
+    if not placement:
+        return calculate_multi_subject_center_backend(selected_centers, file_id)
+    
+    print(f"✅ 完整保留主體: {placement['fully_kept']}，被裁切主體: {placement['cut_off']}")
+    return tuple(placement['center'])
+
 def video_exists(file_id):
     """檢查影片是否存在於資料庫中"""
     with closing(shelve.open(config.SHELVE_FILE)) as db:
@@ -0,0 +1,142 @@
+"""
+AdaptVideo 幀存取規劃模組：在循序 grab 與隨機 seek 之間選擇較便宜的方式
+"""
+import bisect
+import cv2
+from config import config
+
+ACCESS_EXACT = 'exact'
+ACCESS_FAST = 'fast'
+
+def estimate_keyframes(total_frames, fps):
+    """無關鍵幀索引時，依設定的 GOP 長度估計關鍵幀位置"""
+    gop = max(1, int(round((fps or 30) * config.ESTIMATED_GOP_SECONDS)))
+    return list(range(0, max(1, total_frames), gop))
+
+def plan_frame_access(frame_indices, total_frames, keyframes=None, fps=30, mode=ACCESS_EXACT, start_position=0):
+    """
+    為一組幀索引規劃讀取方式
+
+    Args:
+        frame_indices: 要讀取的幀索引
+        total_frames: 影片總幀數
+        keyframes: 已知的關鍵幀索引（遞增），None 時依 GOP 估計
+        fps: 影片 fps，用於估計 GOP
+        mode: 'exact' 讀取精確幀；'fast' 允許以附近的幀（關鍵幀）代替
+        start_position: 解碼器目前的位置（下一個會被讀取的幀）
+
+    Returns:
+        list: 依幀索引遞增排列的步驟，每步為
+            {"frame": 請求的幀, "source_frame": 實際讀取的幀, "action": 'grab'|'seek'|'keyframe', "seek_to": seek 目標}
+    """
+    if total_frames <= 0:
+        return []
+    known_keyframes = keyframes is not None and len(keyframes) > 0
+    keyframes = list(keyframes) if known_keyframes else estimate_keyframes(total_frames, fps)
+    gop = max(1, total_frames // max(1, len(keyframes)))
+    tolerance = int(gop * config.FAST_ACCESS_TOLERANCE) if mode == ACCESS_FAST else 0
+    seek_cost = config.SEEK_COST_FRAMES
+
+    plan = []
+    position = start_position
+    for frame in sorted(set(min(max(0, int(f)), total_frames - 1) for f in frame_indices)):
+        k = bisect.bisect_right(keyframes, frame) - 1
+        prev_keyframe = keyframes[max(0, k)]
+        next_keyframe = keyframes[k + 1] if k + 1 < len(keyframes) else None
+
+        forward_cost = frame - position if frame >= position else float('inf')
+        seek_from_keyframe_cost = seek_cost + (frame - prev_keyframe)
+
+        # 快速模式：目標附近有已知關鍵幀且比精確讀取便宜時，以關鍵幀代替
+        if mode == ACCESS_FAST and known_keyframes:
+            nearest = prev_keyframe
+            if next_keyframe is not None and next_keyframe - frame < frame - prev_keyframe:
+                nearest = next_keyframe
+            keyframe_cost = nearest - position if nearest >= position else float('inf')
+            keyframe_cost = min(keyframe_cost, seek_cost)
+            if abs(nearest - frame) <= tolerance and keyframe_cost < min(forward_cost, seek_from_keyframe_cost):
+                action = 'grab' if nearest >= position and nearest - position <= seek_cost else 'keyframe'
+                plan.append({
+                    "frame": frame, "source_frame": nearest, "action": action,
+                    "seek_to": nearest if action == 'keyframe' else None
+                })
+                position = nearest + 1
+                continue
+
+        # 精確模式：比較往前 grab 與從關鍵幀開始解碼的成本
+        if forward_cost <= seek_from_keyframe_cost:
+            plan.append({"frame": frame, "source_frame": frame, "action": 'grab', "seek_to": None})
+        else:
+            # 有索引時 seek 到關鍵幀再往前 grab；否則交給解碼器自行定位
+            seek_to = prev_keyframe if known_keyframes else frame
+            plan.append({"frame": frame, "source_frame": frame, "action": 'seek', "seek_to": seek_to})
+        position = frame + 1
+
+    return plan
+
+def execute_frame_plan(cap, plan):
+    """依讀取計畫從 capture 讀取幀，逐一 yield (請求的幀索引, 實際幀索引, BGR 幀)"""
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    for step in plan:
+        if step['seek_to'] is not None:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, step['seek_to'])
+            position = step['seek_to']
+        elif position > step['source_frame']:
+            # 解碼器位置與計畫不符（例如被其他呼叫移動過），退回直接定位
+            cap.set(cv2.CAP_PROP_POS_FRAMES, step['source_frame'])
+            position = step['source_frame']
+
+        while position < step['source_frame']:
+            if not cap.grab():
+                break
+            position += 1
+
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position += 1
+        yield step['frame'], step['source_frame'], frame
+
+def read_frames(cap, meta, frame_indices, mode=ACCESS_EXACT, keyframes=None, unique=False):
+    """
+    規劃並讀取多個幀，逐一 yield (實際讀取的幀索引, BGR 幀)
+
+    快速模式下請求的幀可能以附近的關鍵幀代替，返回的索引是實際幀，多個請求也可能對應到同一個幀；
+    unique 時同一個實際幀只讀取並 yield 一次
+    """
+    plan = plan_frame_access(
+        frame_indices, meta['frame_count'], keyframes=keyframes, fps=meta['fps'],
+        mode=mode, start_position=int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    )
+    if unique:
+        seen = set()
+        plan = [step for step in plan if not (step['source_frame'] in seen or seen.add(step['source_frame']))]
+    grabs = sum(1 for step in plan if step['action'] == 'grab')
+    print(f"🎞️ 幀存取計畫 ({mode}): {len(plan)} 幀, grab {grabs}, seek {len(plan) - grabs}")
+    for _, source_idx, frame in execute_frame_plan(cap, plan):
+        yield source_idx, frame
+
+def read_frames_sequential(cap, meta, frame_indices):
+    """
+    從頭循序 grab 一次，只在請求的幀 retrieve，逐一 yield (幀索引, BGR 幀)
+
+    適合要讀取大量幀（例如時間軸縮圖）的情況：不做任何 seek，成本約等於循序讀取整段影片一次
+    """
+    wanted = sorted(set(min(max(0, int(f)), meta['frame_count'] - 1) for f in frame_indices))
+    if not wanted:
+        return
+    print(f"🎞️ 幀存取計畫 (sequential): {len(wanted)} 幀, 循序讀取 {wanted[-1] + 1} 幀")
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    position = 0
+    for frame_idx in wanted:
+        while position <= frame_idx:
+            if not cap.grab():
+                return
+            position += 1
+        # 只有需要的幀才做色彩轉換與複製
+        ret, frame = cap.retrieve()
+        if not ret:
+            return
+        yield frame_idx, frame
@@ -0,0 +1,296 @@
+"""
+AdaptVideo 預覽幀快取模組（memory-mapped numpy）
+"""
+import os
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from config import config
+from video_decoder import decoder_session, get_video_metadata
+from frame_access import read_frames
+from seek_index import get_keyframe_frames
+from proxy_video import resolve_analysis_source, proxy_size
+
+_cache_lock = threading.Lock()  # 只保護下列記憶體狀態，不在持有時做檔案讀寫
+_open_caches = OrderedDict()    # 影片快取路徑前綴 -> (原始影片簽章, 幀索引陣列, memmap)
+_OPEN_CACHE_SIZE = 16
+_video_locks = {}               # 影片快取路徑前綴 -> 合併寫入用的鎖
+_pending_removals = set()       # 仍被映射而暫時無法刪除的舊檔案（Windows）
+
+_FRAMES_SUFFIX = '.frames.npy'
+_INDEX_SUFFIX = '.index.npy'
+
+def _cache_base(video_path):
+    """影片快取檔案的路徑前綴；每次更新寫入新版本 <前綴>.<版本>.frames.npy / .index.npy"""
+    return os.path.join(config.FRAME_CACHE_FOLDER, os.path.basename(video_path))
+
+def _version_paths(base, version):
+    """返回指定版本的 (幀陣列檔案, 索引檔案) 路徑"""
+    return f"{base}.{version}{_FRAMES_SUFFIX}", f"{base}.{version}{_INDEX_SUFFIX}"
+
+def _list_versions(base):
+    """磁碟上此影片快取的所有版本 {版本: 是否已寫完（索引檔案存在）}"""
+    folder, prefix = os.path.split(base)
+    prefix += '.'
+    versions = {}
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return versions
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        for suffix in (_FRAMES_SUFFIX, _INDEX_SUFFIX):
+            version = name[len(prefix):-len(suffix)] if name.endswith(suffix) else ''
+            if version.isdigit():
+                versions[int(version)] = versions.get(int(version), False) or suffix == _INDEX_SUFFIX
+    return versions
+
+def _video_lock(base):
+    """取得單一影片的合併寫入鎖，不同影片的快取更新互不阻塞"""
+    with _cache_lock:
+        return _video_locks.setdefault(base, threading.Lock())
+
+def _source_signature(video_path):
+    """以修改時間與大小判斷快取是否過期"""
+    try:
+        stat = os.stat(video_path)
+        return [stat.st_mtime_ns, stat.st_size]
+    except OSError:
+        return [0, 0]
+
+def _remove_files(paths):
+    """刪除檔案；仍被 memmap 映射（Windows 會拒絕刪除）時留待之後再試"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            with _cache_lock:
+                _pending_removals.add(path)
+            continue
+        with _cache_lock:
+            _pending_removals.discard(path)
+
+def _retry_pending_removals():
+    """重試刪除先前因仍被映射而無法刪除的舊版本檔案"""
+    with _cache_lock:
+        pending = list(_pending_removals)
+    if pending:
+        _remove_files(pending)
+
+def _load(video_path):
+    """開啟影片最新版本的幀快取，返回 (幀索引陣列, memmap)；不存在或過期時返回 None"""
+    base = _cache_base(video_path)
+    signature = _source_signature(video_path)
+    with _cache_lock:
+        if base in _open_caches:
+            cached_signature, indices, frames = _open_caches[base]
+            if cached_signature == signature:
+                _open_caches.move_to_end(base)
+                return indices, frames
+            del _open_caches[base]
+
+    complete = [version for version, done in _list_versions(base).items() if done]
+    if not complete:
+        return None
+    frames_path, index_path = _version_paths(base, max(complete))
+    try:
+        # 索引檔案前兩個值為原始影片簽章，之後為已快取的幀索引（遞增）
+        stored = np.load(index_path)
+        if stored[:2].tolist() != signature:
+            return None
+        frames = np.load(frames_path, mmap_mode='r')
+    except Exception as e:
+        print(f"❌ 讀取幀快取失敗: {e}")
+        return None
+
+    with _cache_lock:
+        _open_caches[base] = (signature, stored[2:], frames)
+        while len(_open_caches) > _OPEN_CACHE_SIZE:
+            _open_caches.popitem(last=False)
+    return stored[2:], frames
+
+def _evict(keep_base):
+    """依最後使用時間刪除其他影片的快取，直到總大小符合上限"""
+    limit = config.FRAME_CACHE_MAX_MB * 1024 * 1024
+    entries = []
+    for name in os.listdir(config.FRAME_CACHE_FOLDER):
+        if name.endswith(_FRAMES_SUFFIX):
+            path = os.path.join(config.FRAME_CACHE_FOLDER, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        # 去掉 .<版本>.frames.npy 得到影片快取路徑前綴
+        base = path[:-len(_FRAMES_SUFFIX)].rsplit('.', 1)[0]
+        if base == keep_base:
+            continue
+        with _cache_lock:
+            _open_caches.pop(base, None)
+        _remove_files([path, path[:-len(_FRAMES_SUFFIX)] + _INDEX_SUFFIX])
+        total -= size
+        print(f"🧹 已回收幀快取: {os.path.basename(path)}")
+
+class _CacheVersionWriter:
+    """
+    新版本的幀快取檔案：建立時複製既有版本的幀，之後新解碼的幀逐一直接寫入 memmap，不需在記憶體中保留
+
+    舊版本可能仍被其他請求映射（Windows 上無法覆寫或刪除），因此不覆寫任何檔案：
+    索引檔案最後寫入，存在即代表此版本完整；發布後再刪除被取代的舊版本。
+    同一影片同時有多個請求寫入時，只保留版本較新的結果（較舊的版本捨棄，之後再請求時重新解碼）
+    """
+
+    def __init__(self, video_path, existing, missing, frame_shape):
+        self.video_path = video_path
+        self.base = _cache_base(video_path)
+        old_indices = existing[0] if existing is not None else np.empty(0, dtype=np.int64)
+        self.indices = np.union1d(old_indices, np.asarray(missing, dtype=np.int64)).astype(np.int64)
+        self.pending = set(missing)
+
+        os.makedirs(config.FRAME_CACHE_FOLDER, exist_ok=True)
+        with _video_lock(self.base):
+            # 在鎖內建立檔案，之後分配的版本號一定較大
+            self.version = max(_list_versions(self.base), default=0) + 1
+            self.frames_path, self.index_path = _version_paths(self.base, self.version)
+            self.frames = np.lib.format.open_memmap(
+                self.frames_path, mode='w+', dtype=np.uint8, shape=(len(self.indices),) + tuple(frame_shape)
+            )
+        if existing is not None:
+            for row, old_row in zip(np.searchsorted(self.indices, old_indices).tolist(), range(len(old_indices))):
+                self.frames[row] = existing[1][old_row]
+
+    def write(self, frame_idx, frame):
+        """寫入一個新解碼的幀，返回 memmap 中的唯讀切片"""
+        row = int(np.searchsorted(self.indices, frame_idx))
+        self.frames[row] = frame
+        self.pending.discard(frame_idx)
+        view = self.frames[row]
+        view.flags.writeable = False
+        return view
+
+    def publish(self):
+        """所有幀都寫入後寫出索引檔案並刪除舊版本；有幀解碼失敗或已有更新的版本時捨棄此版本"""
+        self.frames.flush()
+        with _video_lock(self.base):
+            versions = _list_versions(self.base)
+            newer = any(done and version > self.version for version, done in versions.items())
+            if self.pending or newer:
+                self.discard()
+                return False
+            np.save(self.index_path, np.concatenate([
+                np.array(_source_signature(self.video_path), dtype=np.int64), self.indices
+            ]))
+            with _cache_lock:
+                _open_caches.pop(self.base, None)
+            _remove_files([
+                path for version in versions if version < self.version
+                for path in _version_paths(self.base, version)
+            ])
+        _evict(self.base)
+        return True
+
+    def discard(self):
+        """捨棄此版本（仍被映射時留待之後刪除）"""
+        self.frames = None
+        _remove_files([self.frames_path, self.index_path])
+
+def _iter_decode_frames(video_path, frame_indices):
+    """從代理影片（沒有時從原始影片）逐一解碼指定幀，並統一縮放為代理解析度，yield (幀索引, BGR 幀)"""
+    source_meta = get_video_metadata(video_path)
+    if not source_meta:
+        return
+    size = proxy_size(source_meta['width'], source_meta['height'])
+    analysis_path = resolve_analysis_source(video_path)[0]
+
+    with decoder_session(analysis_path) as (cap, meta):
+        if cap is None or meta['frame_count'] <= 0:
+            return
+        # 代理影片幀數可能略少，將超出範圍的請求對應到最後一幀
+        last_frame = meta['frame_count'] - 1
+        requests = {}
+        for frame_idx in frame_indices:
+            requests.setdefault(min(frame_idx, last_frame), []).append(frame_idx)
+
+        keyframes = get_keyframe_frames(analysis_path)
+        for source_idx, frame in read_frames(cap, meta, list(requests), keyframes=keyframes):
+            if (frame.shape[1], frame.shape[0]) != size:
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            for frame_idx in requests.get(source_idx, []):
+                yield frame_idx, frame
+
+def iter_cached_frames(video_path, frame_indices):
+    """
+    依幀索引遞增順序逐一 yield (幀索引, 唯讀 BGR 幀)
+
+    已快取的幀為 memmap 的切片（不複製）；缺少的幀解碼後直接寫入新版本的快取檔案並輸出其切片，
+    不在記憶體中累積，全部輸出後才發布新版本
+    """
+    wanted = sorted(set(int(f) for f in frame_indices))
+    if not wanted:
+        return
+
+    cached = _load(video_path)
+    hits = {}
+    if cached is not None:
+        indices, frames = cached
+        positions = np.searchsorted(indices, wanted)
+        hits = {
+            frame_idx: frames[pos]
+            for frame_idx, pos in zip(wanted, positions.tolist())
+            if pos < len(indices) and indices[pos] == frame_idx
+        }
+
+    missing = [f for f in wanted if f not in hits]
+    if not missing:
+        # 更新最後使用時間，供跨影片 LRU 回收使用
+        os.utime(cached[1].filename)
+        for frame_idx in wanted:
+            yield frame_idx, hits[frame_idx]
+        return
+
+    # 新解碼的幀直接寫入新版本的 memmap，同一時間只有一個解碼中的幀在記憶體中
+    _retry_pending_removals()
+    decoder = _iter_decode_frames(video_path, missing)
+    writer = None
+    written = {}
+    try:
+        for frame_idx in wanted:
+            if frame_idx in hits:
+                yield frame_idx, hits[frame_idx]
+                continue
+            # 解碼器依遞增順序輸出，推進到目前需要的幀為止
+            for decoded_idx, frame in decoder:
+                if writer is None:
+                    writer = _CacheVersionWriter(video_path, cached, missing, frame.shape)
+                written[decoded_idx] = writer.write(decoded_idx, frame)
+                if decoded_idx >= frame_idx:
+                    break
+            if frame_idx in written:
+                yield frame_idx, written[frame_idx]
+    except BaseException:
+        # 解碼失敗或呼叫端提前結束（例如連線中斷），未寫完的版本不發布
+        if writer is not None:
+            writer.discard()
+        raise
+
+    if writer is not None and writer.publish():
+        print(f"🗂️ 幀快取已更新: 新增 {len(written)} 幀")
+
+def get_cached_frames(video_path, frame_indices):
+    """
+    從幀快取取得代理解析度的 BGR 幀，缺少的幀會解碼後加入快取
+
+    Returns:
+        list: 依 frame_indices 順序的 [(幀索引, 唯讀 BGR 幀)]
+    """
+    lookup = dict(iter_cached_frames(video_path, frame_indices))
+    return [(int(f), lookup[int(f)]) for f in frame_indices if int(f) in lookup]
@@ -0,0 +1,89 @@
+"""
+AdaptVideo 預覽標註模組（直接在 numpy 幀上就地繪製）
+"""
+import numpy as np
+from config import config
+
+WARNING_COLOR = (80, 80, 255)      # 主體被裁切的警告邊框 (BGR)
+SUBJECT_BOX_COLOR = (80, 220, 80)  # 主體框 (BGR)
+SAFE_AREA_COLOR = (255, 255, 255)  # 安全區域參考線 (BGR)
+
+def _blend(region, color, alpha):
+    """將顏色以 alpha 混合到區域上（就地修改，只配置區域大小的暫存）"""
+    if region.size == 0:
+        return
+    if alpha >= 1:
+        region[...] = color
+        return
+    blended = region * (1 - alpha) + np.asarray(color, dtype=np.float32) * alpha
+    region[...] = blended.astype(np.uint8)
+
+def draw_rect_outline(frame, rect, color, thickness, alpha=1.0):
+    """
+    在幀上就地繪製矩形外框，只處理四條邊的像素
+
+    Args:
+        rect: (x1, y1, x2, y2)，外框向內繪製
+    """
+    frame_h, frame_w = frame.shape[:2]
+    x1 = min(max(0, int(round(rect[0]))), frame_w)
+    y1 = min(max(0, int(round(rect[1]))), frame_h)
+    x2 = min(max(x1, int(round(rect[2]))), frame_w)
+    y2 = min(max(y1, int(round(rect[3]))), frame_h)
+    t = max(1, min(int(thickness), (x2 - x1 + 1) // 2, (y2 - y1 + 1) // 2))
+
+    # 上下兩條完整繪製，左右兩條避開角落，避免重疊處混合兩次
+    _blend(frame[y1:y1 + t, x1:x2], color, alpha)
+    _blend(frame[max(y1 + t, y2 - t):y2, x1:x2], color, alpha)
+    _blend(frame[y1 + t:max(y1 + t, y2 - t), x1:x1 + t], color, alpha)
+    _blend(frame[y1 + t:max(y1 + t, y2 - t), max(x1 + t, x2 - t):x2], color, alpha)
+    return frame
+
+def draw_warning_border(frame, thickness, color=WARNING_COLOR, alpha=200 / 255):
+    """主體被裁切時的紅色警告邊框"""
+    return draw_rect_outline(frame, (0, 0, frame.shape[1], frame.shape[0]), color, thickness, alpha)
+
+def draw_safe_area(frame, margin=None, color=SAFE_AREA_COLOR, alpha=0.6):
+    """依邊距比例繪製安全區域參考線"""
+    if margin is None:
+        margin = config.PREVIEW_SAFE_AREA_MARGIN
+    frame_h, frame_w = frame.shape[:2]
+    mx, my = frame_w * margin, frame_h * margin
+    return draw_rect_outline(frame, (mx, my, frame_w - mx, frame_h - my), color, 1, alpha)
+
+def map_box_to_preview(box, crop_rect, output_size):
+    """將原始座標的主體框換算為預覽圖座標"""
+    scale_x = output_size[0] / max(1, crop_rect[2] - crop_rect[0])
+    scale_y = output_size[1] / max(1, crop_rect[3] - crop_rect[1])
+    return (
+        (box[0] - crop_rect[0]) * scale_x, (box[1] - crop_rect[1]) * scale_y,
+        (box[2] - crop_rect[0]) * scale_x, (box[3] - crop_rect[1]) * scale_y
+    )
+
+def annotate_preview(frame, is_adjusted=False, warning_thickness=None, subject_boxes=None,
+                     crop_rect=None, safe_area=False):
+    """
+    在預覽幀上就地疊加標註（警告邊框、主體框、安全區域），返回同一個幀
+
+    Args:
+        frame: 可寫入的 BGR 幀（例如 crop_to_preview 的輸出，不可為幀快取的唯讀切片）
+        warning_thickness: 警告邊框粗細，預設依預覽寬度縮放
+        subject_boxes: 原始座標的主體框列表，需搭配 crop_rect 換算
+        crop_rect: 此預覽在原始座標的裁切區域
+    """
+    frame_h, frame_w = frame.shape[:2]
+    if subject_boxes and crop_rect is not None:
+        thickness = max(1, frame_w // 200)
+        for box in subject_boxes:
+            x1, y1, x2, y2 = map_box_to_preview(box, crop_rect, (frame_w, frame_h))
+            # 完全在裁切範圍外的主體不繪製
+            if x2 <= 0 or y2 <= 0 or x1 >= frame_w or y1 >= frame_h:
+                continue
+            draw_rect_outline(frame, (x1, y1, x2, y2), SUBJECT_BOX_COLOR, thickness, 0.8)
+    if safe_area:
+        draw_safe_area(frame)
+    if is_adjusted:
+        if warning_thickness is None:
+            warning_thickness = max(2, frame_w // 100)
+        draw_warning_border(frame, warning_thickness)
+    return frame
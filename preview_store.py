@@ -0,0 +1,259 @@
+"""
+AdaptVideo 預覽資源儲存模組（以內容雜湊命名，透過 URL 提供）
+"""
+import os
+import re
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from config import config
+
+ASSET_ROUTE = '/api/previews'
+
+_ASSET_NAME_PATTERN = re.compile(r'^([0-9a-f]{32})\.(jpg|png|webp|avif)$')
+_EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/webp': 'webp', 'image/avif': 'avif'}
+_MIMETYPES = {ext: mimetype for mimetype, ext in _EXTENSIONS.items()}
+_QUALITY_FLAGS = {
+    'image/jpeg': cv2.IMWRITE_JPEG_QUALITY,
+    'image/webp': cv2.IMWRITE_WEBP_QUALITY,
+    'image/avif': getattr(cv2, 'IMWRITE_AVIF_QUALITY', None)
+}
+
+_store_lock = threading.Lock()
+_store_bytes = None                  # 儲存區目前的總大小（首次寫入時掃描）
+_evict_lock = threading.Lock()       # 同一時間只由一個請求執行回收
+
+_rendered_lock = threading.Lock()
+_rendered_previews = OrderedDict()   # 預覽參數 -> 已輸出的結果（URL 或 data URI 與附加資訊）
+_RENDERED_CACHE_SIZE = 256
+
+def _encoder_available(mimetype):
+    """確認 OpenCV 是否內建該格式的編碼器"""
+    try:
+        ok, _ = cv2.imencode(f".{_EXTENSIONS[mimetype]}", np.zeros((8, 8, 3), dtype=np.uint8))
+        return bool(ok)
+    except cv2.error:
+        return False
+
+# 依偏好排序、且此環境可編碼的預覽格式
+AVAILABLE_IMAGE_FORMATS = [m for m in config.PREVIEW_IMAGE_FORMATS if _encoder_available(m)]
+print(f"✅ 預覽圖編碼格式: {', '.join(AVAILABLE_IMAGE_FORMATS)}")
+
+def negotiate_image_format(accept_mimetypes):
+    """
+    依請求的 Accept 標頭選擇預覽圖格式
+
+    只採用明確列出的影像格式（不含 */* 與 image/*），避免對未宣告支援的用戶端輸出 WebP/AVIF；
+    沒有符合的格式時使用 JPEG
+    """
+    accepted = {value for value, quality in accept_mimetypes if quality > 0}
+    for mimetype in AVAILABLE_IMAGE_FORMATS:
+        if mimetype in accepted:
+            return mimetype
+    return 'image/jpeg'
+
+def _list_assets():
+    """返回儲存區中所有資源 [(最後使用時間, 大小, 路徑)]"""
+    entries = []
+    try:
+        names = os.listdir(config.PREVIEW_STORE_FOLDER)
+    except OSError:
+        return entries
+    for name in names:
+        if parse_asset_name(name) is None:
+            continue
+        path = os.path.join(config.PREVIEW_STORE_FOLDER, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+    return entries
+
+def _evict_assets(keep_path):
+    """依最後使用時間刪除資源，直到總大小降到上限的 90%"""
+    global _store_bytes
+    if not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        limit = config.PREVIEW_STORE_MAX_MB * 1024 * 1024
+        entries = sorted(_list_assets())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= limit * 0.9:
+                break
+            if path == keep_path:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                # 正在被傳送（Windows 會拒絕刪除）或已被刪除
+                continue
+            total -= size
+            removed += 1
+        with _store_lock:
+            _store_bytes = total
+        if removed:
+            print(f"🧹 已回收預覽資源: {removed} 個")
+    finally:
+        _evict_lock.release()
+
+def touch_asset(name):
+    """更新資源的最後使用時間，供 LRU 回收使用"""
+    try:
+        os.utime(os.path.join(config.PREVIEW_STORE_FOLDER, name))
+    except OSError:
+        pass
+
+def store_asset(data, extension):
+    """以內容雜湊為檔名寫入資源（相同內容只寫一次），返回檔名；總大小超過 PREVIEW_STORE_MAX_MB 時回收最久未使用的資源"""
+    global _store_bytes
+    name = f"{hashlib.sha256(data).hexdigest()[:32]}.{extension}"
+    path = os.path.join(config.PREVIEW_STORE_FOLDER, name)
+    if os.path.exists(path):
+        touch_asset(name)
+        return name
+
+    os.makedirs(config.PREVIEW_STORE_FOLDER, exist_ok=True)
+    partial_path = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+    with open(partial_path, 'wb') as f:
+        f.write(data)
+    os.replace(partial_path, path)
+
+    with _store_lock:
+        if _store_bytes is not None:
+            _store_bytes += len(data)
+        total = _store_bytes
+    if total is None:
+        # 首次寫入時掃描一次儲存區（包含剛寫入的檔案）
+        total = sum(size for _, size, _ in _list_assets())
+        with _store_lock:
+            _store_bytes = total
+    if total > config.PREVIEW_STORE_MAX_MB * 1024 * 1024:
+        _evict_assets(path)
+    return name
+
+def asset_url(name):
+    """資源的 URL"""
+    return f"{ASSET_ROUTE}/{name}"
+
+def parse_asset_name(name):
+    """驗證資源檔名，返回 (內容雜湊, mimetype)；不合法時返回 None"""
+    match = _ASSET_NAME_PATTERN.match(name or '')
+    if not match:
+        return None
+    return match.group(1), _MIMETYPES[match.group(2)]
+
+def asset_exists(url):
+    """資源 URL 對應的檔案是否仍在儲存區"""
+    name = (url or '').rsplit('/', 1)[-1]
+    return parse_asset_name(name) is not None and os.path.exists(os.path.join(config.PREVIEW_STORE_FOLDER, name))
+
+def asset_data_uri(url):
+    """將儲存區中的資源轉為 data URI（供 inline 請求使用）；找不到時返回 None"""
+    name = (url or '').rsplit('/', 1)[-1]
+    parsed = parse_asset_name(name)
+    path = os.path.join(config.PREVIEW_STORE_FOLDER, name)
+    if parsed is None or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f"data:{parsed[1]};base64,{base64.b64encode(f.read()).decode('utf-8')}"
+
+def publish_bytes(data, extension, inline=False):
+    """輸出已編碼的圖片：inline 時返回 data URI，否則寫入儲存區並返回 URL"""
+    if inline:
+        return f"data:{_MIMETYPES[extension]};base64,{base64.b64encode(data).decode('utf-8')}"
+    return asset_url(store_asset(data, extension))
+
+def publish_image(frame, quality=80, inline=False, mimetype='image/jpeg'):
+    """以 cv2 將 BGR 幀編碼為指定格式（JPEG/WebP/AVIF/PNG），並輸出為 URL（或 inline data URI）"""
+    quality_flag = _QUALITY_FLAGS.get(mimetype)
+    params = [quality_flag, int(quality)] if quality_flag is not None else []
+    _, buffer = cv2.imencode(f".{_EXTENSIONS[mimetype]}", frame, params)
+    return publish_bytes(buffer.tobytes(), _EXTENSIONS[mimetype], inline=inline)
+
+def store_data_uri(data_uri):
+    """將既有的 data URI（例如資料庫中的縮圖）轉存並返回 URL；無法解析時原樣返回"""
+    if not data_uri or not data_uri.startswith('data:'):
+        return data_uri
+    try:
+        header, encoded = data_uri.split(',', 1)
+        extension = _EXTENSIONS.get(header[5:].split(';')[0])
+        if extension is None:
+            return data_uri
+        return asset_url(store_asset(base64.b64decode(encoded), extension))
+    except Exception as e:
+        print(f"⚠️ 轉存預覽資源失敗: {e}")
+        return data_uri
+
+def publish_sprite_sheet(rows, quality=80, inline=False, mimetype='image/jpeg'):
+    """
+    將多列 BGR 幀拼成一張 sprite sheet 並只編碼一次
+
+    Args:
+        rows: 幀的二維列表，每一列的幀由左至右排列（同一列的幀可不同尺寸）
+
+    Returns:
+        dict: {"image": URL 或 data URI, "width", "height", "rows": 每列的幀位置 [{"x", "y", "width", "height"}]}
+    """
+    row_heights = [max((frame.shape[0] for frame in row), default=0) for row in rows]
+    row_widths = [sum(frame.shape[1] for frame in row) for row in rows]
+    sheet = np.zeros((max(1, sum(row_heights)), max(1, max(row_widths, default=0)), 3), dtype=np.uint8)
+
+    layout = []
+    y = 0
+    for row, row_height in zip(rows, row_heights):
+        x = 0
+        rects = []
+        for frame in row:
+            height, width = frame.shape[:2]
+            sheet[y:y + height, x:x + width] = frame
+            rects.append({"x": x, "y": y, "width": width, "height": height})
+            x += width
+        layout.append(rects)
+        y += row_height
+
+    return {
+        "image": publish_image(sheet, quality=quality, inline=inline, mimetype=mimetype),
+        "width": sheet.shape[1],
+        "height": sheet.shape[0],
+        "rows": layout
+    }
+
+def _assets_exist(result):
+    """結果中引用的預覽資源 URL 是否都仍在儲存區（可能已被回收）"""
+    if isinstance(result, str):
+        return not result.startswith(ASSET_ROUTE + '/') or asset_exists(result)
+    if isinstance(result, dict):
+        return all(_assets_exist(value) for value in result.values())
+    if isinstance(result, (list, tuple)):
+        return all(_assets_exist(value) for value in result)
+    return True
+
+def get_or_render(key, render):
+    """
+    依預覽參數快取已輸出的結果，相同參數（例如互動調整時回到先前的中心點）不重複裁切與編碼
+
+    Args:
+        key: 可雜湊的預覽參數（需包含輸出格式與 inline）
+        render: 無參數函數，返回要快取的結果；返回 None 時不快取。結果引用的資源被回收後會重新輸出
+    """
+    with _rendered_lock:
+        cached = _rendered_previews.get(key)
+        if cached is not None:
+            _rendered_previews.move_to_end(key)
+    # 引用的資源已被回收時重新輸出
+    if cached is not None and _assets_exist(cached):
+        return cached
+
+    result = render()
+    if result is not None:
+        with _rendered_lock:
+            _rendered_previews[key] = result
+            while len(_rendered_previews) > _RENDERED_CACHE_SIZE:
+                _rendered_previews.popitem(last=False)
+    return result
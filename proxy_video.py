@@ -0,0 +1,135 @@
+"""
+AdaptVideo 低解析度代理影片（mezzanine）模組
+"""
+import os
+import threading
+import cv2
+import numpy as np
+from config import config
+from video_decoder import decoder_session, get_video_metadata, decoder_pool
+from seek_index import save_seek_index
+from scene_detection import SceneCutDetector, save_scenes
+
+_jobs_lock = threading.Lock()
+_running_jobs = set()
+
+def proxy_path_for(video_path):
+    """代理影片的檔案路徑（MJPEG 全 I 幀 AVI）"""
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(config.PROXY_FOLDER, f"{name}_proxy.avi")
+
+def proxy_size(width, height):
+    """代理影片的尺寸（寬度不超過 PROXY_WIDTH，且為偶數）"""
+    scale = min(1.0, config.PROXY_WIDTH / width)
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+def generate_proxy(video_path, proxy_path=None, with_scenes=True):
+    """
+    循序解碼原始影片並寫出低解析度全 I 幀代理影片，返回代理影片資訊
+
+    with_scenes 時順便以縮小後的幀偵測場景切換並保存場景索引，不需再解碼一次原始影片
+    """
+    if proxy_path is None:
+        proxy_path = proxy_path_for(video_path)
+    os.makedirs(os.path.dirname(proxy_path), exist_ok=True)
+    partial_path = proxy_path[:-4] + '.partial.avi'
+
+    with decoder_session(video_path) as (cap, meta):
+        if cap is None or meta['width'] <= 0:
+            return None
+
+        proxy_w, proxy_h = proxy_size(meta['width'], meta['height'])
+        fps = meta['fps'] or 30
+
+        writer = cv2.VideoWriter(partial_path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (proxy_w, proxy_h))
+        if not writer.isOpened():
+            print(f"❌ 無法建立代理影片: {partial_path}")
+            return None
+        writer.set(cv2.VIDEOWRITER_PROP_QUALITY, config.PROXY_JPEG_QUALITY)
+        # 每一幀都已解碼並縮小，逐幀比較即可得到精確的切換幀
+        detector = SceneCutDetector(fps, step=1) if with_scenes else None
+
+        frame_count = 0
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            small = cv2.resize(frame, (proxy_w, proxy_h), interpolation=cv2.INTER_AREA)
+            writer.write(small)
+            if detector is not None and detector.wants(frame_count):
+                detector.add(frame_count, small)
+            frame_count += 1
+        writer.release()
+
+    if frame_count == 0:
+        os.remove(partial_path)
+        return None
+
+    # 寫完才改名，避免其他請求讀到未完成的檔案
+    os.replace(partial_path, proxy_path)
+    decoder_pool.invalidate(proxy_path)
+
+    # 全 I 幀：每一幀都是關鍵幀
+    frames = np.arange(frame_count, dtype=np.float64)
+    save_seek_index(proxy_path, np.stack([frames, frames / fps], axis=1))
+    if detector is not None:
+        save_scenes(video_path, detector.scenes(frame_count))
+
+    print(f"✅ 代理影片已建立: {os.path.basename(proxy_path)} ({proxy_w}x{proxy_h}, {frame_count} 幀)")
+    return {
+        "path": proxy_path,
+        "width": proxy_w,
+        "height": proxy_h,
+        "frame_count": frame_count
+    }
+
+def start_proxy_job(video_path, on_complete=None):
+    """在背景執行緒產生代理影片，完成後呼叫 on_complete(proxy_info)"""
+    key = os.path.abspath(video_path)
+    with _jobs_lock:
+        if key in _running_jobs:
+            return False
+        _running_jobs.add(key)
+
+    def run():
+        try:
+            proxy_info = generate_proxy(video_path)
+            if on_complete is not None:
+                on_complete(proxy_info)
+        except Exception as e:
+            print(f"❌ 背景產生代理影片失敗: {e}")
+        finally:
+            with _jobs_lock:
+                _running_jobs.discard(key)
+
+    threading.Thread(target=run, daemon=True).start()
+    return True
+
+def get_proxy(video_path):
+    """
+    取得可用於預覽與分析的代理影片
+
+    Returns:
+        tuple: (代理影片路徑, x 縮放比例, y 縮放比例)，代理座標 = 原始座標 × 比例；
+               尚未產生時返回 None
+    """
+    proxy_path = proxy_path_for(video_path)
+    if not os.path.exists(proxy_path):
+        return None
+    source_meta = get_video_metadata(video_path)
+    proxy_meta = get_video_metadata(proxy_path)
+    if not source_meta or not proxy_meta or source_meta['width'] <= 0 or source_meta['height'] <= 0:
+        return None
+    return (
+        proxy_path,
+        proxy_meta['width'] / source_meta['width'],
+        proxy_meta['height'] / source_meta['height']
+    )
+
+def resolve_analysis_source(video_path):
+    """返回預覽/分析應使用的影片 (路徑, x 比例, y 比例)，沒有代理影片時使用原始影片"""
+    proxy = get_proxy(video_path)
+    if proxy is None:
+        return video_path, 1.0, 1.0
+    return proxy
@@ -4,26 +4,44 @@ AdaptVideo API 路由
 import os
 import base64
 import traceback
-from io import BytesIO
 from datetime import datetime
 from flask import Blueprint, request, jsonify, render_template, send_from_directory
-from PIL import Image, ImageDraw
+import cv2
+import numpy as np
 
 from config import config
 from utils import (
     find_video_file, validate_json_request, generate_unique_filename,
     validate_file_type, validate_file_size, format_error_response,
-    format_success_response
+    format_success_response, subject_box_from_center, get_subject_weight, get_subject_boxes,
+    get_request_tenant
 )
 from video_processing import (
     get_video_info, extract_thumbnail, analyze_video_with_llm,
-    extract_frames_generic, apply_smart_crop, crop_frame_for_thumbnail,
-    perform_video_conversion
+    extract_frames_generic, apply_smart_crop, crop_frames_for_thumbnails,
+    perform_video_conversion, compute_scene_centers, preview_size, crop_to_preview,
+    LLM_AI_AVAILABLE
+)
+from crop_geometry import compute_crop_rect, feasibility_matrix
+from template_registry import (
+    get_templates as list_templates, get_template, resolve_size_template, add_custom_template
 )
 from database import (
     get_video_data, update_video_data, save_video_data, get_all_videos,
     add_conversion_record, save_llm_analysis, calculate_multi_subject_center_backend,
-    video_exists
+    video_exists, get_video_analysis_options, calculate_multi_subject_cover_center
+)
+from subject_tracker import track_subjects, combine_tracks
+from scene_detection import load_or_detect_scenes, expand_scene_centers
+from saliency import propose_subjects
+from seek_index import build_seek_index, save_seek_index
+from proxy_video import start_proxy_job, resolve_analysis_source
+from video_decoder import get_video_metadata
+from frame_cache import get_cached_frames
+from preview_overlay import annotate_preview
+from preview_store import (
+    store_data_uri, publish_image, parse_asset_name, negotiate_image_format, get_or_render, touch_asset,
+    asset_exists, asset_data_uri
 )
 
 # 創建藍圖
@@ -36,8 +54,26 @@ def index():
 
 @api.route('/api/templates')
 def get_templates():
-    """獲取 DOOH 模板列表"""
-    return jsonify(config.DOOH_TEMPLATES)
+    """獲取 DOOH 模板列表（含請求租戶的自訂模板）"""
+    return jsonify(list_templates(get_request_tenant()))
+
+@api.route('/api/templates', methods=['POST'])
+@validate_json_request(['name', 'width', 'height'])
+def create_custom_template():
+    """新增租戶自訂模板（相同尺寸會更新名稱與描述，id 不變）"""
+    data = request.json
+    tenant = get_request_tenant()
+    if not tenant:
+        return format_error_response("缺少租戶: 請提供 X-Tenant-ID 標頭或 tenant 參數")
+    try:
+        width, height = int(data['width']), int(data['height'])
+    except (TypeError, ValueError):
+        return format_error_response("width 與 height 必須是整數")
+    if width <= 0 or height <= 0:
+        return format_error_response("width 與 height 必須大於 0")
+
+    template = add_custom_template(tenant, data['name'], width, height, data.get('description', ''))
+    return jsonify(template), 201
 
 @api.route('/api/upload', methods=['POST'])
 def upload_video():
@@ -71,21 +107,28 @@ def upload_video():
 
     # 獲取影片資訊和縮圖
     video_info = get_video_info(abs_upload_path)
+    save_seek_index(abs_upload_path, build_seek_index(abs_upload_path, video_info.get('fps')))
     thumbnail = extract_thumbnail(abs_upload_path)
+    thumbnail_url = store_data_uri(thumbnail)
     
     # 保存到資料庫
     video_data = {
         "original_path": upload_path,  # 儲存相對路徑以保持可攜性
         "original_filename": file.filename,
         "video_info": video_info,
-        "thumbnail_b64": thumbnail
+        "thumbnail_b64": thumbnail,
+        "thumbnail_url": thumbnail_url
     }
     save_video_data(file_id, video_data)
 
+    # 背景產生低解析度代理影片並在同一次解碼中偵測場景切換，完成前預覽與分析會使用原始影片
+    # （代理影片與場景索引皆以檔案路徑尋找，不寫入資料庫）
+    start_proxy_job(abs_upload_path)
+
     return jsonify({
         "file_id": file_id,
         "video_info": video_info,
-        "thumbnail": thumbnail
+        "thumbnail": thumbnail if request.form.get('inline') else thumbnail_url
     })
 
 @api.route('/api/analyze', methods=['POST'])
@@ -95,6 +138,7 @@ def analyze_video_api():
     data = request.get_json()
     file_id = data['file_id']
     conversation_history = data.get('conversation_history', [])
+    inline = bool(data.get('inline'))
 
     # 檢查影片是否存在
     video_record = get_video_data(file_id)
@@ -106,12 +150,20 @@ def analyze_video_api():
         return format_error_response("影片檔案不存在", 404)
     
     video_info = video_record.get('video_info', {})
+    local_only = data.get('local_only', False)
     
     # 使用 LLM 分析影片
-    analysis_result = analyze_video_with_llm(
-        video_path, conversation_history, 
-        video_info.get('width'), video_info.get('height')
-    )
+    analysis_result = None
+    if not local_only and LLM_AI_AVAILABLE:
+        analysis_result = analyze_video_with_llm(
+            video_path, conversation_history, 
+            video_info.get('width'), video_info.get('height')
+        )
+    
+    # LLM 不可用、逾時或失敗時，退回本地顯著性分析
+    if not analysis_result:
+        print("⚠️ LLM 分析不可用，使用本地顯著性分析")
+        analysis_result = propose_subjects(video_path)
     
     if not analysis_result:
         return format_error_response("AI分析影片時發生錯誤", 500)
@@ -120,24 +172,31 @@ def analyze_video_api():
     if 'analysis_options' not in analysis_result:
         analysis_result['analysis_options'] = []
 
-    # 為每個分析選項生成縮圖
+    # 為每個分析選項生成縮圖（只解碼一次參考幀）
     if video_info.get('width', 0) > 0 and video_info.get('height', 0) > 0:
-        for option in analysis_result.get('analysis_options', []):
-            center = option.get('center')
-            if center:
-                # 假設box是相對於原始影片尺寸
-                box_size = 200  # 縮圖大小
-                x, y = center
-                
-                # 確保裁切框在影片範圍內
-                x1 = max(0, int(x - box_size / 2))
-                y1 = max(0, int(y - box_size / 2))
-                x2 = min(video_info['width'], int(x + box_size / 2))
-                y2 = min(video_info['height'], int(y + box_size / 2))
-                
-                box = (x1, y1, x2, y2)
-                thumbnail_b64 = crop_frame_for_thumbnail(video_path, box)
-                option['thumbnail'] = thumbnail_b64
+        options_with_center = [o for o in analysis_result.get('analysis_options', []) if o.get('center')]
+        for option in options_with_center:
+            # 假設box是相對於原始影片尺寸，並確保裁切框在影片範圍內
+            if not option.get('box'):
+                box = subject_box_from_center(option['center'], video_info['width'], video_info['height'])
+                option['box'] = list(box)
+        thumbnails = crop_frames_for_thumbnails(
+            video_path, [o['box'] for o in options_with_center],
+            inline=inline, mimetype=negotiate_image_format(request.accept_mimetypes)
+        )
+        for option, thumbnail in zip(options_with_center, thumbnails):
+            option['thumbnail'] = thumbnail
+
+        # 一次計算每個主體 × 每個模板的裁切可行性，瀏覽模板時不需再呼叫 /api/smart_crop_analysis
+        templates = list_templates(get_request_tenant())
+        matrix = feasibility_matrix(
+            video_info['width'], video_info['height'], templates, [o['center'] for o in options_with_center]
+        )
+        for option, feasibility in zip(options_with_center, matrix):
+            option['feasibility'] = feasibility
+        analysis_result['feasibility_templates'] = [
+            {"id": t['id'], "name": t['name'], "width": t['width'], "height": t['height']} for t in templates
+        ]
 
     # 保存分析結果到資料庫
     save_llm_analysis(file_id, analysis_result)
@@ -145,14 +204,44 @@ def analyze_video_api():
 
     return jsonify(analysis_result)
 
+def _listing_thumbnail_url(video):
+    """
+    返回影片列表使用的縮圖 URL
+
+    舊影片只有 data URI、或縮圖已被儲存區回收時，轉存（必要時從影片重新擷取）一次並寫回資料庫，
+    之後的列表請求直接使用 URL；寫回時不更新時間戳，避免改變列表排序
+    """
+    thumbnail_url = video.get('thumbnail_url')
+    if thumbnail_url and asset_exists(thumbnail_url):
+        return thumbnail_url
+
+    data_uri = video.get('thumbnail')
+    if not data_uri:
+        video_path = find_video_file(video['file_id'])
+        data_uri = extract_thumbnail(os.path.abspath(video_path)) if video_path else None
+    thumbnail_url = store_data_uri(data_uri)
+    if not thumbnail_url or thumbnail_url == data_uri:
+        return data_uri
+    update_video_data(video['file_id'], {"thumbnail_url": thumbnail_url, "thumbnail_b64": None}, touch=False)
+    return thumbnail_url
+
 @api.route('/api/uploaded_videos', methods=['GET'])
 def get_uploaded_videos():
-    """獲取已上傳影片的列表"""
+    """獲取已上傳影片的列表（縮圖預設為 URL，?inline=1 時為 data URI）"""
+    inline = request.args.get('inline', '').lower() in ('1', 'true')
     videos = get_all_videos()
+    for video in videos:
+        thumbnail_url = _listing_thumbnail_url(video) if not (inline and video['thumbnail']) else None
+        video.pop('thumbnail_url', None)
+        if not inline:
+            video['thumbnail'] = thumbnail_url
+        elif not video['thumbnail']:
+            # 已轉存的舊影片不再保留 data URI，從儲存區讀取
+            video['thumbnail'] = asset_data_uri(thumbnail_url) or thumbnail_url
     return jsonify(videos)
 
 @api.route('/api/convert', methods=['POST'])
-@validate_json_request(['file_id', 'width', 'height'])
+@validate_json_request(['file_id'])
 def convert_video_api():
     """處理影片轉換請求"""
     print("--- 收到 /api/convert 請求 ---")
@@ -162,9 +251,23 @@ def convert_video_api():
     file_id = data.get('file_id')
     target_width = data.get('width')
     target_height = data.get('height')
+
+    # 以模板 id（或名稱）指定尺寸；直接給寬高時對應到已登錄模板或 size-寬x高，讓每次轉換都有穩定的模板 id
+    tenant = get_request_tenant()
+    if data.get('template_id'):
+        template = get_template(data['template_id'], tenant)
+        if not template:
+            return format_error_response(f"找不到模板: {data['template_id']}", 404)
+        target_width, target_height = template['width'], template['height']
+    elif target_width is None or target_height is None:
+        return format_error_response("缺少必要參數: template_id 或 width, height")
+    else:
+        template = resolve_size_template(target_width, target_height, tenant)
     crop_mode = data.get('crop_mode', 'center')
     selected_subject_centers = data.get('centers')  # 支援多個中心點
     selected_subject_center = data.get('center')    # 向後相容單一中心點
+    scene_centers = data.get('scene_centers')       # 每個場景的中心點（可為 null）
+    multi_subject_mode = data.get('multi_subject_mode', 'weighted')  # weighted 或 cover
 
     print(f"收到轉換請求: file_id={file_id}, mode={crop_mode}, centers={selected_subject_centers}, center={selected_subject_center}")
 
@@ -179,20 +282,48 @@ def convert_video_api():
     
     # 處理中心點選擇
     manual_center = None
-    if crop_mode == 'llm':
+    center_track = None
+    if crop_mode == 'track':
+        # 以選中的 LLM 主體為種子追蹤，產生每幀中心點
+        seeds = selected_subject_centers or ([selected_subject_center] if selected_subject_center else [])
+        if seeds:
+            analysis_options = get_video_analysis_options(file_id)
+            boxes = {tuple(o['center']): o.get('box') for o in analysis_options if o.get('center')}
+            # 所有主體在同一次解碼中追蹤
+            tracks = track_subjects(upload_path, [(seed, boxes.get(tuple(seed))) for seed in seeds])
+            weights = [get_subject_weight(seed, analysis_options)[0] for seed in seeds]
+            center_track = combine_tracks(tracks, weights)
+        if center_track is None:
+            print("⚠️ 主體追蹤失敗或未提供中心點，將退回至中心裁切。")
+            crop_mode = 'center'
+    elif crop_mode in ('llm', 'scene'):
         # 優先使用多個中心點，如果沒有則使用單一中心點
-        if selected_subject_centers and len(selected_subject_centers) > 0:
+        if selected_subject_centers and len(selected_subject_centers) > 1 and multi_subject_mode == 'cover':
+            # 搜尋能完整保留最多高重要性主體的裁切位置
+            manual_center = calculate_multi_subject_cover_center(
+                selected_subject_centers, file_id, int(target_width), int(target_height)
+            )
+            print(f"🎯 多主體覆蓋裁切中心點: {manual_center}")
+        elif selected_subject_centers and len(selected_subject_centers) > 0:
             # 計算多個主體的加權中心點
             manual_center = calculate_multi_subject_center_backend(selected_subject_centers, file_id)
             print(f"🎯 計算多主體中心點: {manual_center}")
         elif selected_subject_center:
             manual_center = tuple(selected_subject_center)
             print(f"🎯 使用單一主體中心點: {manual_center}")
-        else:
+        elif crop_mode == 'llm':
             # 如果使用者選了LLM但沒有選主體，就退回到標準置中
             print("⚠️ LLM模式下未提供中心點，將退回至中心裁切。")
             crop_mode = 'center'
     
+    # 逐場景裁切：在渲染前解析所有場景的中心點並展開為每幀查表
+    if crop_mode == 'scene' or (scene_centers and center_track is None):
+        center_track = resolve_scene_center_track(file_id, upload_path, scene_centers, manual_center)
+        if center_track is None:
+            print("⚠️ 無法取得場景索引，將使用單一中心點裁切。")
+            if crop_mode == 'scene':
+                crop_mode = 'llm' if manual_center else 'center'
+    
     print(f"🚀 開始轉換: input={os.path.basename(upload_path)}, output={output_filename}, mode={crop_mode}, center={manual_center}")
     
     # 執行轉換
@@ -202,7 +333,8 @@ def convert_video_api():
         target_width=int(target_width),
         target_height=int(target_height),
         crop_mode=crop_mode,
-        manual_center=manual_center
+        manual_center=manual_center,
+        center_track=center_track
     )
 
     # 檢查轉換結果
@@ -221,7 +353,8 @@ def convert_video_api():
     add_conversion_record(file_id, {
         "path": output_path,
         "filename": os.path.basename(output_path),
-        "template_name": f"{target_width}x{target_height}"
+        "template_id": template['id'],
+        "template_name": template['name']
     })
     
     print(f"✅ 已將影片轉換資料儲存至資料庫: {file_id}")
@@ -230,13 +363,68 @@ def convert_video_api():
         "file_id": file_id,
         "download_url": f"/outputs/{output_filename}",
         "filename": output_filename,
+        "template_id": template['id'],
         "converted_video_path": output_path  # 添加完整路徑供預覽使用
     })
 
+def resolve_scene_center_track(file_id, upload_path, scene_centers, default_center):
+    """解析每個場景的裁切中心點（提供的或自動偵測的），返回每幀中心點陣列"""
+    scenes = load_or_detect_scenes(upload_path, resolve_analysis_source(upload_path)[0])
+    if not scenes:
+        return None
+    
+    video_info = (get_video_data(file_id) or {}).get('video_info', {})
+    if default_center is None:
+        default_center = (video_info.get('width', 1920) / 2, video_info.get('height', 1080) / 2)
+    
+    if scene_centers:
+        # 使用者提供的場景中心點，未指定的場景使用預設中心點
+        padded = list(scene_centers) + [None] * (len(scenes) - len(scene_centers))
+        resolved = [list(c) if c else list(default_center) for c in padded[:len(scenes)]]
+    else:
+        resolved = compute_scene_centers(upload_path, scenes, default_center)
+    
+    print(f"🎬 逐場景裁切: {len(scenes)} 個場景, 中心點 {resolved}")
+    return expand_scene_centers(scenes, resolved)
+
+def _render_crop_preview(file_id, upload_path, target_width, target_height, center, max_width, max_height,
+                         inline, mimetype, annotate=False, safe_area=False):
+    """從幀快取的中間幀（代理解析度）直接裁切並縮放到顯示尺寸，返回 (預覽圖, 是否被裁切)"""
+    video_data = get_video_data(file_id) or {}
+    video_info = video_data.get('video_info', {})
+    metadata = get_video_metadata(upload_path)
+    if not metadata or metadata['frame_count'] <= 0:
+        return None
+    original_width = video_info.get('width') or metadata['width']
+    original_height = video_info.get('height') or metadata['height']
+
+    # 與縮圖相同的中間幀；幀快取命中時為 memmap 切片，不需解碼
+    frames = get_cached_frames(upload_path, [metadata['frame_count'] // 2])
+    if not frames:
+        return None
+
+    if not center:
+        center = [original_width / 2, original_height / 2]
+    crop_rect, is_adjusted = compute_crop_rect(original_width, original_height, target_width, target_height, center)
+    output_size = preview_size(target_width, target_height, max_width=max_width, max_height=max_height)
+    preview = crop_to_preview(frames[0][1], crop_rect, output_size, original_width, original_height)
+
+    # 如果主角被裁切，就地疊加紅色警告邊框；annotate 時另外標出主體框
+    subject_boxes = None
+    if annotate:
+        subject_boxes = get_subject_boxes(video_data.get('llm_analysis_options'), original_width, original_height)
+    annotate_preview(preview, is_adjusted=is_adjusted, subject_boxes=subject_boxes,
+                     crop_rect=crop_rect, safe_area=safe_area)
+
+    preview_image = publish_image(
+        preview, quality=config.PREVIEW_IMAGE_QUALITY['crop_preview'], inline=inline, mimetype=mimetype
+    )
+    return preview_image, is_adjusted
+
 @api.route('/api/preview_crop', methods=['POST'])
-@validate_json_request(['thumbnail_data', 'target_width', 'target_height', 'original_width', 'original_height', 'center'])
+@validate_json_request(['target_width', 'target_height', 'center'])
 def preview_crop():
-    """產生裁切預覽圖"""
+    """產生裁切預覽圖（提供 file_id 時由伺服器端快取的幀裁切，不需上傳縮圖）"""
     data = request.json
     base64_image = data.get('thumbnail_data')
     target_width = data.get('target_width')
@@ -246,6 +434,15 @@ def preview_crop():
     center = data.get('center')
     centers = data.get('centers')  # 支援多個中心點
     file_id = data.get('file_id')  # 需要 file_id 來計算多主體中心點
+    inline = bool(data.get('inline'))
+    annotate = bool(data.get('annotate'))  # 標出主體框
+    safe_area = bool(data.get('safe_area'))  # 標出安全區域
+    mimetype = negotiate_image_format(request.accept_mimetypes)
+
+    if not base64_image and not file_id:
+        return format_error_response("缺少必要參數: thumbnail_data 或 file_id")
+    if base64_image and not (original_width and original_height):
+        return format_error_response("缺少必要參數: original_width, original_height")
 
     # 處理多選中心點
     if centers and len(centers) > 0 and file_id:
@@ -253,32 +450,66 @@ def preview_crop():
         if center:
             center = list(center)  # 轉換為列表格式
 
+    if not base64_image:
+        upload_path = find_video_file(file_id)
+        if not upload_path:
+            return format_error_response(f"找不到影片檔案: {file_id}", 404)
+        max_width = data.get('max_width') or config.DEFAULT_CROP_PREVIEW_MAX_WIDTH
+        max_height = data.get('max_height') or 180
+        try:
+            # annotate 時主體框來自最新的分析結果，一併納入快取鍵，重新分析後不會返回舊的標註
+            subjects_key = None
+            if annotate:
+                analysis_options = (get_video_data(file_id) or {}).get('llm_analysis_options') or []
+                subjects_key = tuple(
+                    (tuple(o['center']), tuple(o.get('box') or ())) for o in analysis_options if o.get('center')
+                )
+            # 中心點取整數像素作為快取鍵，互動調整時回到相同位置可直接返回
+            key = (
+                'crop_preview', file_id, target_width, target_height,
+                tuple(int(round(c)) for c in center) if center else None,
+                max_width, max_height, inline, mimetype, annotate, safe_area, subjects_key
+            )
+            rendered = get_or_render(key, lambda: _render_crop_preview(
+                file_id, upload_path, target_width, target_height, center, max_width, max_height,
+                inline, mimetype, annotate=annotate, safe_area=safe_area
+            ))
+            if rendered is None:
+                return format_error_response("無法讀取影片幀", 500)
+            preview_image, is_subject_cropped = rendered
+            return jsonify({
+                "preview_image": preview_image,
+                "is_cropped": is_subject_cropped
+            })
+        except Exception as e:
+            print(f"❌ 預覽裁切失敗: {e}")
+            traceback.print_exc()
+            return format_error_response("產生預覽圖失敗", 500)
+
     try:
-        # 解碼圖片
+        # 以 cv2 直接解碼為 BGR 幀
         image_data = base64.b64decode(base64_image.split(',')[1])
-        img = Image.open(BytesIO(image_data))
+        frame = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return format_error_response("無法解碼縮圖")
 
-        # 使用共用的智慧裁切函數
-        cropped_img, is_subject_cropped = apply_smart_crop(
-            img, target_width, target_height, center,
+        # 使用共用的智慧裁切函數（numpy 輸入直接返回 BGR 幀）
+        cropped_frame, is_subject_cropped = apply_smart_crop(
+            frame, target_width, target_height, center,
             original_width=original_width, original_height=original_height
         )
         
-        # 如果主角被裁切，疊加一個紅色警告圖層
-        if is_subject_cropped:
-            overlay = Image.new('RGBA', cropped_img.size, (255, 0, 0, 0))  # 透明
-            draw = ImageDraw.Draw(overlay)
-            draw.rectangle([(0, 0), (cropped_img.width, cropped_img.height)], 
-                          outline=(255, 80, 80, 200), width=10)  # 紅色邊框
-            cropped_img = Image.alpha_composite(cropped_img.convert("RGBA"), overlay)
-
-        # 將結果轉回 Base64
-        buffered = BytesIO()
-        cropped_img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+        # 如果主角被裁切，直接在幀上就地疊加紅色警告邊框（模板解析度，10px）
+        annotate_preview(cropped_frame, is_adjusted=is_subject_cropped, warning_thickness=10, safe_area=safe_area)
+
+        # 以 cv2 編碼為協商後的格式（取代無損 PNG），輸出為預覽資源 URL（inline 時為 data URI）
+        preview_image = publish_image(
+            cropped_frame, quality=config.PREVIEW_IMAGE_QUALITY['crop_preview'], inline=inline,
+            mimetype=mimetype
+        )
         
         return jsonify({
-            "preview_image": f"data:image/png;base64,{img_str}",
+            "preview_image": preview_image,
             "is_cropped": is_subject_cropped
         })
 
@@ -287,6 +518,24 @@ def preview_crop():
         traceback.print_exc()
         return format_error_response("產生預覽圖失敗", 500)
 
+@api.route('/api/previews/<name>')
+def serve_preview_asset(name):
+    """提供預覽資源；檔名即內容雜湊，使用強 ETag 與長期快取"""
+    parsed = parse_asset_name(name)
+    if not parsed or not os.path.exists(os.path.join(config.PREVIEW_STORE_FOLDER, name)):
+        return format_error_response("找不到預覽資源", 404)
+    content_hash, mimetype = parsed
+    touch_asset(name)
+
+    response = send_from_directory(
+        config.PREVIEW_STORE_FOLDER, name, mimetype=mimetype, etag=False, conditional=False,
+        max_age=config.PREVIEW_ASSET_MAX_AGE
+    )
+    response.set_etag(content_hash)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
 @api.route('/uploads/<path:filename>')
 def serve_upload_video(filename):
     """提供原始上傳的影片檔案"""
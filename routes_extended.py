@@ -2,27 +2,123 @@
 AdaptVideo 擴展 API 路由
 """
 import os
-import base64
+import json
 import traceback
-from io import BytesIO
-from flask import Blueprint, request, jsonify
-from PIL import Image
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 
 from config import config
-from utils import find_video_file, validate_json_request, format_error_response
-from video_processing import extract_frames_generic, apply_smart_crop
-from database import get_video_data, calculate_multi_subject_center_backend
+from utils import (
+    find_video_file, validate_json_request, format_error_response, get_subject_boxes,
+    get_request_tenant
+)
+from video_processing import (
+    iter_frames, sample_frame_indices, preview_size, crop_to_preview
+)
+from crop_geometry import compute_crop_rect, analyze_crop_feasibility
+from frame_cache import get_cached_frames, iter_cached_frames
+from preview_overlay import annotate_preview
+from preview_store import (
+    publish_image, publish_sprite_sheet, negotiate_image_format, asset_exists, asset_data_uri
+)
+from timeline_strip import build_timeline_strip, resolve_strip_mode, strip_cache_key
+from video_decoder import get_video_metadata
+from database import (
+    get_video_data, calculate_multi_subject_center_backend, get_timeline_strip, save_timeline_strip
+)
+from scene_detection import load_or_detect_scenes
+from proxy_video import resolve_analysis_source
+from crop_placement import build_subjects, evaluate_placement_for_templates
+from template_registry import get_template, get_templates, find_templates
 
 # 創建擴展路由藍圖
 api_extended = Blueprint('api_extended', __name__)
 
+def _preview_frame_count(total_frames):
+    """模板預覽使用的取樣幀數"""
+    if total_frames < 30:
+        return min(total_frames, 3)
+    return min(6, max(3, total_frames // 30))
+
+def _original_preview_frame_count(total_frames):
+    """原始/轉換後影片預覽使用的取樣幀數"""
+    if total_frames < 20:
+        return min(total_frames, 4)
+    return min(8, max(4, total_frames // 20))
+
+def _preview_annotations(options, video_data, original_width, original_height):
+    """依請求選項返回 annotate_preview 的參數：annotate 時標出被裁切警告與主體框，safe_area 時標出安全區域"""
+    annotate = bool(options.get('annotate'))
+    subject_boxes = None
+    if annotate:
+        subject_boxes = get_subject_boxes(video_data.get('llm_analysis_options'), original_width, original_height)
+    return annotate, {"subject_boxes": subject_boxes, "safe_area": bool(options.get('safe_area'))}
+
+def _preview_response(frames, build_metadata, options, quality, empty_message="無法提取預覽幀"):
+    """
+    輸出預覽幀（frames 為逐一產生的 BGR 幀），圖片格式依 Accept 標頭協商（AVIF/WebP/JPEG）
+
+    options 為請求 JSON：
+    - "format": "sprite" 時所有幀拼成一張 sprite sheet，只編碼一次，返回 {"sprite": {...}}
+    - "stream": true 時以 NDJSON 逐幀輸出：每幀一行 {"type": "frame", ...}，最後一行為 {"type": "done", ...metadata}
+    - 其餘情況收集所有幀後返回 {"preview_frames": [...]}
+    - "inline": true 時圖片為 data URI，否則為預覽資源 URL
+    """
+    inline = bool(options.get('inline'))
+    mimetype = negotiate_image_format(request.accept_mimetypes)
+
+    if options.get('format') == 'sprite':
+        frames = list(frames)
+        if not frames:
+            return format_error_response(empty_message, 500)
+        sprite = publish_sprite_sheet([frames], quality=quality, inline=inline, mimetype=mimetype)
+        print(f"✅ 成功生成 {len(frames)} 幀的 sprite sheet")
+        return jsonify({
+            "sprite": {
+                "image": sprite['image'],
+                "width": sprite['width'],
+                "height": sprite['height'],
+                "frames": sprite['rows'][0]
+            },
+            **build_metadata(len(frames))
+        })
+
+    preview_frames = (publish_image(frame, quality=quality, inline=inline, mimetype=mimetype) for frame in frames)
+
+    if not options.get('stream'):
+        preview_frames = list(preview_frames)
+        if not preview_frames:
+            return format_error_response(empty_message, 500)
+        print(f"✅ 成功生成 {len(preview_frames)} 個預覽幀")
+        return jsonify({"preview_frames": preview_frames, **build_metadata(len(preview_frames))})
+
+    def generate():
+        count = 0
+        try:
+            for frame in preview_frames:
+                yield json.dumps({"type": "frame", "index": count, "frame": frame}) + "\n"
+                count += 1
+            if count == 0:
+                yield json.dumps({"type": "error", "error": empty_message}, ensure_ascii=False) + "\n"
+                return
+            print(f"✅ 已串流 {count} 個預覽幀")
+            yield json.dumps({"type": "done", **build_metadata(count)}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            print(f"❌ 串流預覽幀失敗: {e}")
+            traceback.print_exc()
+            yield json.dumps({"type": "error", "error": "生成預覽失敗"}, ensure_ascii=False) + "\n"
+
+    return Response(
+        stream_with_context(generate()), mimetype='application/x-ndjson',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_extended.route('/api/smart_crop_analysis', methods=['POST'])
-@validate_json_request(['file_id', 'template_name'])
+@validate_json_request(['file_id'])
 def smart_crop_analysis():
     """智慧裁切分析 - 分析主體在特定尺寸下的最佳裁切方案"""
     data = request.json
     file_id = data.get('file_id')
-    template_name = data.get('template_name')
+    template_name = data.get('template_id') or data.get('template_name')  # 可用模板 id 或名稱
     center = data.get('center')
     centers = data.get('centers')  # 支援多個中心點
 
@@ -36,7 +132,9 @@ def smart_crop_analysis():
         return format_error_response("缺少中心點參數")
 
     # 找到模板
-    template = next((t for t in config.DOOH_TEMPLATES if t['name'] == template_name), None)
+    if not template_name:
+        return format_error_response("缺少必要參數: template_id 或 template_name")
+    template = get_template(template_name, get_request_tenant())
     if not template:
         return format_error_response(f"找不到模板: {template_name}", 404)
 
@@ -50,60 +148,104 @@ def smart_crop_analysis():
     original_height = video_info.get('height', 1080)
     
     # 分析裁切可行性
-    target_width, target_height = template['width'], template['height']
-    target_ratio = target_width / target_height
-    original_ratio = original_width / original_height
-    
-    # 計算縮放比例
-    scale = max(target_width / original_width, target_height / original_height)
-    scaled_width = original_width * scale
-    scaled_height = original_height * scale
-    
-    # 分析中心點的可行性
-    desired_center_x = center[0] * scale
-    desired_center_y = center[1] * scale
-    
-    half_w, half_h = target_width / 2, target_height / 2
-    min_x, max_x = half_w, scaled_width - half_w
-    min_y, max_y = half_h, scaled_height - half_h
-    
-    final_crop_x = max(min_x, min(desired_center_x, max_x))
-    final_crop_y = max(min_y, min(desired_center_y, max_y))
-    
-    # 計算偏移量
-    offset_x = abs(final_crop_x - desired_center_x)
-    offset_y = abs(final_crop_y - desired_center_y)
-    
-    # 分析結果
-    is_perfect_fit = offset_x < 1 and offset_y < 1
-    coverage_x = min(1.0, target_width / scaled_width) * 100
-    coverage_y = min(1.0, target_height / scaled_height) * 100
-    
-    # 生成建議
-    analysis = {
-        "is_perfect_fit": is_perfect_fit,
-        "offset_x": round(offset_x, 1),
-        "offset_y": round(offset_y, 1),
-        "coverage_x": round(coverage_x, 1),
-        "coverage_y": round(coverage_y, 1),
-        "scale_factor": round(scale, 2),
-        "recommendation": "完美適配" if is_perfect_fit else "需要調整" if (offset_x > 10 or offset_y > 10) else "良好適配"
-    }
+    analysis = analyze_crop_feasibility(original_width, original_height, [template], center)[0]['analysis']
     
     return jsonify(analysis)
 
+@api_extended.route('/api/scenes/<file_id>', methods=['GET'])
+def get_scenes(file_id):
+    """獲取影片的場景切換索引（上傳後於背景計算；尚未完成或舊影片會在請求時補算）"""
+    video_data = get_video_data(file_id)
+    if not video_data:
+        return format_error_response(f"找不到影片資料: {file_id}", 404)
+
+    upload_path = find_video_file(file_id)
+    if not upload_path:
+        return format_error_response(f"找不到影片檔案: {file_id}", 404)
+    scenes = load_or_detect_scenes(upload_path, resolve_analysis_source(upload_path)[0])
+
+    return jsonify({
+        "file_id": file_id,
+        "scene_count": len(scenes),
+        "scenes": scenes
+    })
+
+@api_extended.route('/api/timeline_strip/<file_id>', methods=['GET'])
+def timeline_strip(file_id):
+    """獲取時間軸縮圖 sprite sheet，供選擇預覽時間點（每支影片依參數快取）"""
+    if not get_video_data(file_id):
+        return format_error_response(f"找不到影片資料: {file_id}", 404)
+    upload_path = find_video_file(file_id)
+    if not upload_path:
+        return format_error_response(f"找不到影片檔案: {file_id}", 404)
+
+    count = min(max(1, request.args.get('count', config.TIMELINE_STRIP_COUNT, type=int)), config.TIMELINE_STRIP_MAX_COUNT)
+    thumb_width = min(max(16, request.args.get('width', config.TIMELINE_THUMB_WIDTH, type=int)), config.PROXY_WIDTH)
+    mode = resolve_strip_mode(upload_path, request.args.get('mode'))
+    mimetype = negotiate_image_format(request.accept_mimetypes)
+
+    try:
+        key = strip_cache_key(count, thumb_width, mode, mimetype)
+        strip = get_timeline_strip(file_id, key)
+        if strip is None or not asset_exists(strip['image']):
+            strip = build_timeline_strip(upload_path, count=count, thumb_width=thumb_width, mode=mode, mimetype=mimetype)
+            if strip is None:
+                return format_error_response("無法提取時間軸縮圖", 500)
+            save_timeline_strip(file_id, key, strip)
+
+        response = {"file_id": file_id, "frame_count": len(strip['frames']), **strip}
+        if request.args.get('inline', '').lower() in ('1', 'true'):
+            response["image"] = asset_data_uri(strip['image'])
+        return jsonify(response)
+
+    except Exception as e:
+        print(f"❌ 生成時間軸縮圖失敗: {e}")
+        traceback.print_exc()
+        return format_error_response("生成時間軸縮圖失敗", 500)
+
+@api_extended.route('/api/multi_subject_placement', methods=['POST'])
+@validate_json_request(['file_id', 'centers'])
+def multi_subject_placement():
+    """多主體裁切位置分析 - 為每個模板找出能完整保留最多主體的裁切位置"""
+    data = request.json
+    file_id = data.get('file_id')
+    centers = data.get('centers')
+    template_names = data.get('template_names')
+
+    video_data = get_video_data(file_id)
+    if not video_data:
+        return format_error_response(f"找不到影片資料: {file_id}", 404)
+
+    video_info = video_data.get('video_info', {})
+    original_width = video_info.get('width', 1920)
+    original_height = video_info.get('height', 1080)
+
+    templates = get_templates(get_request_tenant())
+    if template_names:
+        templates = find_templates(template_names, get_request_tenant())
+
+    subjects = build_subjects(centers, video_data.get('llm_analysis_options', []), original_width, original_height)
+    placements = evaluate_placement_for_templates(subjects, original_width, original_height, templates)
+
+    return jsonify({
+        "subjects": [{"subject": s['subject'], "center": s['center'], "box": s['box']} for s in subjects],
+        "placements": placements
+    })
+
 @api_extended.route('/api/generate_preview', methods=['POST'])
-@validate_json_request(['file_id', 'template_name'])
+@validate_json_request(['file_id'])
 def generate_preview():
     """為 AI 推薦的模板生成多幀預覽動畫"""
     data = request.json
     file_id = data.get('file_id')
-    template_name = data.get('template_name')
+    template_name = data.get('template_id') or data.get('template_name')  # 可用模板 id 或名稱
     center = data.get('center')
     centers = data.get('centers')  # 支援多個中心點
 
     # 找到模板
-    template = next((t for t in config.DOOH_TEMPLATES if t['name'] == template_name), None)
+    if not template_name:
+        return format_error_response("缺少必要參數: template_id 或 template_name")
+    template = get_template(template_name, get_request_tenant())
     if not template:
         return format_error_response(f"找不到模板: {template_name}", 404)
 
@@ -140,76 +282,141 @@ def generate_preview():
 
     try:
         # 計算需要提取的幀數
-        import cv2
-        cap = cv2.VideoCapture(upload_path)
-        if not cap.isOpened():
+        metadata = get_video_metadata(upload_path)
+        if not metadata:
             return format_error_response("無法開啟影片檔案", 500)
         
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        cap.release()
+        total_frames = metadata['frame_count']
         
         if total_frames <= 0:
             return format_error_response("影片無有效幀", 500)
             
-        num_preview_frames = min(6, max(3, max(1, total_frames // 30)))
-        if total_frames < 30:
-            num_preview_frames = min(total_frames, 3)
-        
-        # 使用共用函數提取幀
-        pil_frames = extract_frames_generic(upload_path, num_preview_frames, return_pil=True)
-        
-        if not pil_frames:
-            return format_error_response("無法提取預覽幀", 500)
-        
-        preview_frames = []
         target_width, target_height = template['width'], template['height']
-        is_adjusted = False
         
         # 獲取原始影片尺寸
         video_info = video_data.get('video_info', {})
         original_width = video_info.get('width', 1920)
         original_height = video_info.get('height', 1080)
         
-        for i, img in enumerate(pil_frames):
-            print(f"🎬 處理第 {i+1}/{len(pil_frames)} 幀")
-            
-            # 使用共用的裁切函數
-            cropped_img, frame_adjusted = apply_smart_crop(
-                img, target_width, target_height, center,
-                original_width=original_width, original_height=original_height
-            )
-            
-            # 記錄是否有調整
-            if not is_adjusted and frame_adjusted:
-                is_adjusted = True
-            
-            # 調整預覽圖大小以便顯示（最大寬度250px）
-            preview_scale = min(config.DEFAULT_CROP_PREVIEW_MAX_WIDTH / target_width, 180 / target_height)
-            if preview_scale < 1:
-                preview_w = int(target_width * preview_scale)
-                preview_h = int(target_height * preview_scale)
-                cropped_img = cropped_img.resize((preview_w, preview_h), Image.LANCZOS)
-
-            # 將結果轉為 Base64
-            buffered = BytesIO()
-            cropped_img.save(buffered, format="JPEG", quality=80)
-            img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-            preview_frames.append(f"data:image/jpeg;base64,{img_str}")
+        # 在原始座標計算裁切區域，直接從幀縮放到預覽尺寸（最大寬度250px），不經過模板解析度
+        crop_rect, is_adjusted = compute_crop_rect(original_width, original_height, target_width, target_height, center)
+        output_size = preview_size(target_width, target_height)
         
-        print(f"✅ 成功生成 {len(preview_frames)} 個預覽幀")
-        return jsonify({
-            "preview_frames": preview_frames,
+        # 從代理解析度的幀快取逐幀讀取，每幀裁切（並就地標註）編碼完成即可輸出
+        annotate, annotations = _preview_annotations(data, video_data, original_width, original_height)
+        preview_frames = (
+            annotate_preview(
+                crop_to_preview(frame, crop_rect, output_size, original_width, original_height),
+                is_adjusted=annotate and is_adjusted, crop_rect=crop_rect, **annotations
+            )
+            for _, frame in iter_cached_frames(upload_path, sample_frame_indices(total_frames, _preview_frame_count(total_frames)))
+        )
+        return _preview_response(preview_frames, lambda count: {
             "is_adjusted": is_adjusted,
             "template": template,
-            "frame_count": len(preview_frames),
+            "frame_count": count,
             "subject_name": selected_subject_name
-        })
+        }, data, config.PREVIEW_IMAGE_QUALITY['template_preview'])
 
     except Exception as e:
         print(f"❌ 生成多幀預覽失敗: {e}")
         traceback.print_exc()
         return format_error_response("生成預覽失敗", 500)
 
+@api_extended.route('/api/template_previews', methods=['POST'])
+@validate_json_request(['file_id'])
+def template_previews():
+    """一次為所有（或指定的）模板生成裁切預覽與可行性分析，樣本幀只讀取一次"""
+    data = request.json
+    file_id = data.get('file_id')
+    template_names = data.get('template_names')
+    center = data.get('center')
+    centers = data.get('centers')  # 支援多個中心點
+    inline = bool(data.get('inline'))
+    use_sprite = data.get('format') == 'sprite'
+    mimetype = negotiate_image_format(request.accept_mimetypes)
+    quality = config.PREVIEW_IMAGE_QUALITY['template_preview']
+
+    templates = get_templates(get_request_tenant())
+    if template_names:
+        # template_names 可混用模板 id 與名稱
+        templates = find_templates(template_names, get_request_tenant())
+        if not templates:
+            return format_error_response(f"找不到模板: {', '.join(template_names)}", 404)
+
+    upload_path = find_video_file(file_id)
+    if not upload_path:
+        return format_error_response(f"找不到影片檔案: {file_id}", 404)
+
+    video_data = get_video_data(file_id)
+    if not video_data:
+        return format_error_response(f"找不到影片資料: {file_id}", 404)
+
+    video_info = video_data.get('video_info', {})
+    original_width = video_info.get('width', 1920)
+    original_height = video_info.get('height', 1080)
+
+    # 處理多選中心點
+    if centers and len(centers) > 0:
+        center = calculate_multi_subject_center_backend(centers, file_id)
+        if center:
+            center = list(center)
+    if not center:
+        center = [original_width / 2, original_height / 2]
+
+    try:
+        metadata = get_video_metadata(upload_path)
+        if not metadata or metadata['frame_count'] <= 0:
+            return format_error_response("無法開啟影片檔案", 500)
+
+        total_frames = metadata['frame_count']
+        cached_frames = get_cached_frames(upload_path, sample_frame_indices(total_frames, _preview_frame_count(total_frames)))
+        if not cached_frames:
+            return format_error_response("無法提取預覽幀", 500)
+
+        # 所有模板的裁切區域與可行性一次以向量化計算
+        geometries = analyze_crop_feasibility(original_width, original_height, templates, center)
+
+        annotate, annotations = _preview_annotations(data, video_data, original_width, original_height)
+        rows = []
+        for template, geometry in zip(templates, geometries):
+            output_size = preview_size(template['width'], template['height'])
+            rows.append([
+                annotate_preview(
+                    crop_to_preview(frame, geometry['crop_rect'], output_size, original_width, original_height),
+                    is_adjusted=annotate and geometry['is_adjusted'], crop_rect=geometry['crop_rect'], **annotations
+                )
+                for _, frame in cached_frames
+            ])
+
+        results = [
+            {"template": template, "is_adjusted": geometry['is_adjusted'], "analysis": geometry['analysis']}
+            for template, geometry in zip(templates, geometries)
+        ]
+        response = {
+            "center": center,
+            "frame_count": len(cached_frames),
+            "templates": results
+        }
+
+        if use_sprite:
+            # 所有模板共用一張 sprite sheet，每個模板一列
+            sprite = publish_sprite_sheet(rows, quality=quality, inline=inline, mimetype=mimetype)
+            response["sprite"] = {"image": sprite['image'], "width": sprite['width'], "height": sprite['height']}
+            for result, rects in zip(results, sprite['rows']):
+                result["sprite_frames"] = rects
+        else:
+            for result, row in zip(results, rows):
+                result["preview_frames"] = [publish_image(frame, quality=quality, inline=inline, mimetype=mimetype) for frame in row]
+
+        print(f"✅ 成功生成 {len(results)} 個模板的預覽")
+        return jsonify(response)
+
+    except Exception as e:
+        print(f"❌ 生成模板預覽失敗: {e}")
+        traceback.print_exc()
+        return format_error_response("生成模板預覽失敗", 500)
+
 @api_extended.route('/api/generate_original_preview', methods=['POST'])
 @validate_json_request(['file_id'])
 def generate_original_preview():
@@ -223,43 +430,25 @@ def generate_original_preview():
 
     try:
         # 計算需要提取的幀數
-        import cv2
-        cap = cv2.VideoCapture(upload_path)
-        if not cap.isOpened():
+        metadata = get_video_metadata(upload_path)
+        if not metadata:
             return format_error_response("無法開啟影片檔案", 500)
         
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        cap.release()
+        total_frames = metadata['frame_count']
         
         if total_frames <= 0:
             return format_error_response("影片無有效幀", 500)
             
-        num_preview_frames = min(8, max(4, max(1, total_frames // 20)))
-        if total_frames < 20:
-            num_preview_frames = min(total_frames, 4)
-        
-        # 使用共用函數提取幀，並設定最大寬度為300px
-        pil_frames = extract_frames_generic(
-            upload_path, num_preview_frames, 
-            return_pil=True, max_width=config.DEFAULT_PREVIEW_MAX_WIDTH, quality=85
+        # 從幀快取逐幀讀取，並縮小至最大寬度300px
+        preview_frames = (
+            frame for _, frame in iter_frames(
+                upload_path, _original_preview_frame_count(total_frames),
+                max_width=config.DEFAULT_PREVIEW_MAX_WIDTH, use_proxy=True
+            )
+        )
+        return _preview_response(
+            preview_frames, lambda count: {"frame_count": count}, data, config.PREVIEW_IMAGE_QUALITY['original_preview']
         )
-        
-        if not pil_frames:
-            return format_error_response("無法提取預覽幀", 500)
-        
-        # 將PIL圖像轉為base64
-        preview_frames = []
-        for img in pil_frames:
-            buffered = BytesIO()
-            img.save(buffered, format="JPEG", quality=85)
-            img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-            preview_frames.append(f"data:image/jpeg;base64,{img_str}")
-        
-        print(f"✅ 成功生成原始影片 {len(preview_frames)} 個預覽幀")
-        return jsonify({
-            "preview_frames": preview_frames,
-            "frame_count": len(preview_frames)
-        })
 
     except Exception as e:
         print(f"❌ 生成原始影片預覽失敗: {e}")
@@ -332,59 +521,35 @@ def generate_converted_preview():
 
     try:
         # 計算需要提取的幀數
-        import cv2
-        cap = cv2.VideoCapture(converted_video_path)
-        if not cap.isOpened():
+        metadata = get_video_metadata(converted_video_path)
+        if not metadata:
             return format_error_response("無法開啟轉換後的影片檔案", 500)
         
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        cap.release()
+        total_frames = metadata['frame_count']
         
         if total_frames <= 0:
             return format_error_response("轉換後影片無有效幀", 500)
             
-        num_preview_frames = min(8, max(4, max(1, total_frames // 20)))
-        if total_frames < 20:
-            num_preview_frames = min(total_frames, 4)
-        
-        # 使用共用函數提取幀，並設定最大寬度為300px
-        pil_frames = extract_frames_generic(
-            converted_video_path, num_preview_frames, 
-            return_pil=True, max_width=config.DEFAULT_PREVIEW_MAX_WIDTH, quality=85
+        # 逐幀解碼轉換後影片，並縮小至最大寬度300px
+        preview_frames = (
+            frame for _, frame in iter_frames(
+                converted_video_path, _original_preview_frame_count(total_frames),
+                max_width=config.DEFAULT_PREVIEW_MAX_WIDTH
+            )
         )
         
-        if not pil_frames:
-            return format_error_response("無法提取轉換後影片的預覽幀", 500)
-        
-        # 將PIL圖像轉為base64
-        preview_frames = []
-        for img in pil_frames:
-            buffered = BytesIO()
-            img.save(buffered, format="JPEG", quality=85)
-            img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-            preview_frames.append(f"data:image/jpeg;base64,{img_str}")
-        
-        # 獲取轉換後影片的基本資訊
-        cap = cv2.VideoCapture(converted_video_path)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = frame_count / fps if fps > 0 else 0
-        cap.release()
-        
-        print(f"✅ 成功生成轉換後影片 {len(preview_frames)} 個預覽幀")
-        return jsonify({
-            "preview_frames": preview_frames,
-            "frame_count": len(preview_frames),
-            "video_info": {
-                "width": width,
-                "height": height,
-                "fps": round(fps, 2),
-                "duration": round(duration, 2),
-                "total_frames": frame_count
-            }
-        })
+        # 轉換後影片的基本資訊（使用快取的 metadata）
+        video_info = {
+            "width": metadata['width'],
+            "height": metadata['height'],
+            "fps": round(metadata['fps'], 2),
+            "duration": round(metadata['duration'], 2),
+            "total_frames": metadata['frame_count']
+        }
+        return _preview_response(
+            preview_frames, lambda count: {"frame_count": count, "video_info": video_info},
+            data, config.PREVIEW_IMAGE_QUALITY['converted_preview'], empty_message="無法提取轉換後影片的預覽幀"
+        )
 
     except Exception as e:
         print(f"❌ 生成轉換後影片預覽失敗: {e}")
@@ -502,17 +667,15 @@ def get_video_comparison_data():
     
     # 獲取轉換後影片的資訊
     try:
-        import cv2
-        cap = cv2.VideoCapture(converted_video_path)
-        if cap.isOpened():
+        metadata = get_video_metadata(converted_video_path)
+        if metadata:
             converted_info = {
-                'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-                'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
-                'fps': cap.get(cv2.CAP_PROP_FPS),
-                'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                'width': metadata['width'],
+                'height': metadata['height'],
+                'fps': metadata['fps'],
+                'frame_count': metadata['frame_count'],
+                'duration': metadata['duration']
             }
-            converted_info['duration'] = converted_info['frame_count'] / converted_info['fps'] if converted_info['fps'] > 0 else 0
-        cap.release()
     except Exception as e:
         print(f"❌ 獲取轉換後影片資訊失敗: {e}")
     
@@ -0,0 +1,125 @@
+"""
+AdaptVideo 本地顯著性主體偵測模組（LLM 不可用時的備援）
+"""
+import cv2
+import numpy as np
+from config import config
+from video_decoder import decoder_session
+from frame_access import read_frames, ACCESS_FAST
+from seek_index import get_keyframe_frames
+from proxy_video import resolve_analysis_source
+from template_registry import get_templates
+
+def _sample_gray_frames(video_path, num_frames, size):
+    """均勻取樣數幀並縮為指定尺寸的灰階圖，返回 (K, H, W) 陣列與原始尺寸"""
+    analysis_path, scale_x, scale_y = resolve_analysis_source(video_path)
+    with decoder_session(analysis_path) as (cap, meta):
+        if cap is None:
+            return None, 0, 0
+
+        # 顯著圖尺寸固定，只需換算回原始影片尺寸
+        width = int(round(meta['width'] / scale_x))
+        height = int(round(meta['height'] / scale_y))
+        total_frames = meta['frame_count']
+
+        sample_indices = [int((i + 0.5) * total_frames / num_frames) for i in range(num_frames)]
+        keyframes = get_keyframe_frames(analysis_path)
+        frames = []
+        for _, frame in read_frames(cap, meta, sample_indices, mode=ACCESS_FAST, keyframes=keyframes):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            frames.append(cv2.resize(gray, size, interpolation=cv2.INTER_AREA))
+
+    if not frames:
+        return None, width, height
+    return np.stack(frames).astype(np.float32) / 255.0, width, height
+
+def _box_mean_3x3(stack):
+    """對 (K, H, W) 陣列做 3x3 平均濾波（向量化）"""
+    padded = np.pad(stack, ((0, 0), (1, 1), (1, 1)), mode='edge')
+    h, w = stack.shape[1:]
+    total = np.zeros_like(stack)
+    for dy in range(3):
+        for dx in range(3):
+            total += padded[:, dy:dy + h, dx:dx + w]
+    return total / 9.0
+
+def spectral_residual_saliency(stack):
+    """以頻譜殘差法一次計算多幀的顯著圖，返回 (K, H, W) 且正規化至 0-1"""
+    spectrum = np.fft.fft2(stack, axes=(1, 2))
+    log_amplitude = np.log(np.abs(spectrum) + 1e-8).astype(np.float32)
+    phase = np.angle(spectrum)
+    residual = log_amplitude - _box_mean_3x3(log_amplitude)
+    saliency = np.abs(np.fft.ifft2(np.exp(residual + 1j * phase), axes=(1, 2))) ** 2
+    saliency = np.stack([cv2.GaussianBlur(s.astype(np.float32), (0, 0), 2.5) for s in saliency])
+    peak = saliency.reshape(len(saliency), -1).max(axis=1)[:, None, None]
+    return saliency / np.maximum(peak, 1e-8)
+
+def _recommend_templates_by_ratio(width, height, count=2):
+    """推薦長寬比最接近原始影片的模板"""
+    if width <= 0 or height <= 0:
+        return []
+    ratio = np.log(width / height)
+    ranked = sorted(get_templates(), key=lambda t: abs(np.log(t['width'] / t['height']) - ratio))
+    return [t['name'] for t in ranked[:count]]
+
+def propose_subjects(video_path, num_frames=None, max_subjects=None):
+    """以本地顯著性偵測產生與 analyze_video_with_llm 相同格式的分析結果"""
+    if num_frames is None:
+        num_frames = config.SALIENCY_NUM_FRAMES
+    if max_subjects is None:
+        max_subjects = config.SALIENCY_MAX_SUBJECTS
+
+    size = config.SALIENCY_MAP_SIZE
+    stack, width, height = _sample_gray_frames(video_path, num_frames, size)
+    if stack is None or width <= 0 or height <= 0:
+        return None
+
+    saliency = spectral_residual_saliency(stack).mean(axis=0)
+
+    # 以平均顯著度的倍數作為門檻，取連通區域作為候選主體
+    mask = (saliency > saliency.mean() * config.SALIENCY_THRESHOLD_FACTOR).astype(np.uint8)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+    scale_x = width / size[0]
+    scale_y = height / size[1]
+    ys, xs = np.indices(saliency.shape)
+    label_ids = np.arange(1, count)
+    flat_labels = labels.ravel()
+    weights = saliency.ravel()
+    mass = np.bincount(flat_labels, weights=weights, minlength=count)[1:]
+    cx = np.bincount(flat_labels, weights=weights * xs.ravel(), minlength=count)[1:] / np.maximum(mass, 1e-8)
+    cy = np.bincount(flat_labels, weights=weights * ys.ravel(), minlength=count)[1:] / np.maximum(mass, 1e-8)
+
+    order = np.argsort(mass)[::-1][:max_subjects]
+    total_mass = mass.sum() if len(mass) else 0
+    importance_levels = ['high', 'medium', 'low']
+
+    analysis_options = []
+    for rank, k in enumerate(order):
+        x, y, w, h, _ = stats[label_ids[k]]
+        share = mass[k] / total_mass if total_mass > 0 else 0
+        analysis_options.append({
+            "subject": f"顯著區域 {rank + 1}",
+            "importance": importance_levels[min(rank, len(importance_levels) - 1)],
+            "confidence": round(float(min(0.9, 0.5 + share)), 2),
+            "center": [int(round((cx[k] + 0.5) * scale_x)), int(round((cy[k] + 0.5) * scale_y))],
+            "box": [int(x * scale_x), int(y * scale_y), int((x + w) * scale_x), int((y + h) * scale_y)]
+        })
+
+    if not analysis_options:
+        analysis_options.append({
+            "subject": "畫面中心",
+            "importance": "medium",
+            "confidence": 0.5,
+            "center": [width // 2, height // 2]
+        })
+
+    recommended = _recommend_templates_by_ratio(width, height)
+    print(f"✅ 本地顯著性分析完成: {len(analysis_options)} 個候選主體")
+    return {
+        "suggestions": "### 本地快速分析\n\nAI 顧問目前無法使用，以下主體由本地顯著性偵測產生，"
+                       "建議優先選擇長寬比與原始影片相近的版位：" + "、".join(recommended),
+        "recommended_template_names": recommended,
+        "analysis_options": analysis_options,
+        "source": "local_saliency"
+    }
@@ -0,0 +1,156 @@
+"""
+AdaptVideo 場景切換偵測模組
+"""
+import os
+import json
+import threading
+import cv2
+import numpy as np
+from config import config
+from video_decoder import decoder_session
+
+def _frame_histogram(frame):
+    """將幀縮至極小尺寸後計算正規化 HSV 色彩直方圖"""
+    small = cv2.resize(frame, config.SCENE_DETECTION_SIZE, interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+class SceneCutDetector:
+    """逐幀累積直方圖差異偵測場景切換，可接在任何循序解碼流程中（例如產生代理影片時）"""
+
+    def __init__(self, fps, threshold=None, step=None):
+        self.fps = fps or 30
+        self.threshold = config.SCENE_CUT_THRESHOLD if threshold is None else threshold
+        self.step = max(1, config.SCENE_DETECTION_FRAME_STEP if step is None else step)
+        self.min_scene_frames = max(1, int(self.fps * config.MIN_SCENE_DURATION))
+        self.cut_frames = [0]
+        self.prev_hist = None
+
+    def wants(self, frame_idx):
+        """此幀是否需要比較（只有需要的幀才 retrieve）"""
+        return frame_idx % self.step == 0
+
+    def add(self, frame_idx, frame):
+        """加入一個需要比較的 BGR 幀；step 大於 1 時切換點記錄在其後第一個取樣幀，需以 refine_cuts 修正"""
+        hist = _frame_histogram(frame)
+        if self.prev_hist is not None:
+            distance = cv2.compareHist(self.prev_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+            if distance > self.threshold and frame_idx - self.cut_frames[-1] >= self.min_scene_frames:
+                self.cut_frames.append(frame_idx)
+        self.prev_hist = hist
+
+    def refine_cuts(self, cap):
+        """
+        step 大於 1 時，切換點位於前一個取樣幀與偵測到的取樣幀之間；
+        重新讀取這段幀，以相鄰幀直方圖差異最大處作為實際切換點（切換點通常很少，seek 成本可忽略）
+        """
+        if self.step <= 1:
+            return
+        refined = [0]
+        for cut in self.cut_frames[1:]:
+            start = max(refined[-1], cut - self.step)
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            hists = []
+            for _ in range(start, cut + 1):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                hists.append(_frame_histogram(frame))
+            distances = [
+                cv2.compareHist(hists[j - 1], hists[j], cv2.HISTCMP_BHATTACHARYYA)
+                for j in range(1, len(hists))
+            ]
+            refined.append(start + 1 + int(np.argmax(distances)) if distances else cut)
+        self.cut_frames = refined
+
+    def scenes(self, total_frames):
+        """依已偵測的切換點返回場景列表"""
+        if total_frames <= 0:
+            return []
+        bounds = np.append(np.asarray(self.cut_frames, dtype=np.int64), total_frames)
+        scenes = []
+        for i in range(len(bounds) - 1):
+            start, end = int(bounds[i]), int(bounds[i + 1])
+            scenes.append({
+                "index": i,
+                "start_frame": start,
+                "end_frame": end,
+                "start_time": round(start / self.fps, 3),
+                "end_time": round(end / self.fps, 3)
+            })
+        print(f"✅ 場景偵測完成: {len(scenes)} 個場景, 共 {total_frames} 幀")
+        return scenes
+
+def detect_scenes(video_path, threshold=None):
+    """以單次循序低解析度解碼偵測場景切換，返回場景列表"""
+    with decoder_session(video_path) as (cap, meta):
+        if cap is None:
+            return []
+
+        detector = SceneCutDetector(meta['fps'], threshold)
+        frame_idx = 0
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        while cap.grab():
+            if detector.wants(frame_idx):
+                ret, frame = cap.retrieve()
+                if ret:
+                    detector.add(frame_idx, frame)
+            frame_idx += 1
+        detector.refine_cuts(cap)
+
+    # 以實際解碼的幀數為準，容器宣告的幀數可能不準確
+    return detector.scenes(frame_idx or meta['frame_count'])
+
+def scene_index_path(video_path):
+    """場景索引 sidecar 檔案路徑"""
+    return os.path.join(config.INDEX_FOLDER, f"{os.path.basename(video_path)}.scenes.json")
+
+def save_scenes(video_path, scenes):
+    """將場景列表存為 JSON sidecar 檔案（先寫暫存檔再改名）"""
+    os.makedirs(config.INDEX_FOLDER, exist_ok=True)
+    path = scene_index_path(video_path)
+    partial_path = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+    with open(partial_path, 'w', encoding='utf-8') as f:
+        json.dump(scenes, f)
+    os.replace(partial_path, path)
+    return path
+
+def load_scenes(video_path):
+    """讀取場景索引 sidecar 檔案，尚未計算時返回 None"""
+    path = scene_index_path(video_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"❌ 讀取場景索引失敗: {e}")
+        return None
+
+def load_or_detect_scenes(video_path, source_path=None):
+    """
+    讀取背景工作已計算的場景索引；尚未完成時立即偵測並保存
+
+    Args:
+        source_path: 實際解碼的影片（例如幀索引相同的代理影片），預設為 video_path
+    """
+    scenes = load_scenes(video_path)
+    if scenes is None:
+        scenes = detect_scenes(source_path or video_path)
+        save_scenes(video_path, scenes)
+    return scenes
+
+def expand_scene_centers(scenes, scene_centers, total_frames=None):
+    """將每個場景的中心點展開為每幀中心點陣列 (N, 2)，渲染時只需查表"""
+    if not scenes:
+        return None
+    if total_frames is None:
+        total_frames = scenes[-1]['end_frame']
+    lengths = np.array([s['end_frame'] - s['start_frame'] for s in scenes], dtype=np.int64)
+    centers = np.asarray(scene_centers, dtype=np.float64).reshape(len(scenes), 2)
+    track = np.repeat(centers, np.maximum(lengths, 0), axis=0)
+    if len(track) < total_frames:
+        # 補齊容器宣告幀數與實際解碼幀數的差異
+        track = np.vstack([track, np.repeat(centers[-1:], total_frames - len(track), axis=0)])
+    return track[:total_frames]
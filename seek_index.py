@@ -0,0 +1,97 @@
+"""
+AdaptVideo 關鍵幀 / seek 索引模組
+"""
+import os
+import re
+import subprocess
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import config
+
+try:
+    import imageio_ffmpeg
+    FFMPEG_EXE = imageio_ffmpeg.get_ffmpeg_exe()
+    SEEK_INDEX_AVAILABLE = True
+except Exception as e:
+    FFMPEG_EXE = None
+    SEEK_INDEX_AVAILABLE = False
+    print(f"⚠️ 找不到 ffmpeg，將無法建立關鍵幀索引: {e}")
+
+_PTS_TIME_PATTERN = re.compile(r"pts_time:\s*(-?[0-9.]+)")
+
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 64
+
+def seek_index_path(video_path):
+    """關鍵幀索引 sidecar 檔案路徑"""
+    return os.path.join(config.INDEX_FOLDER, f"{os.path.basename(video_path)}.keyframes.npy")
+
+def build_seek_index(video_path, fps):
+    """只解碼關鍵幀以建立索引，返回 (K, 2) 陣列：[幀索引, 時間戳(秒)]"""
+    if not SEEK_INDEX_AVAILABLE or not fps or fps <= 0:
+        return None
+    command = [
+        FFMPEG_EXE, '-hide_banner', '-nostats', '-skip_frame', 'nokey',
+        '-i', video_path, '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-'
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, errors='replace',
+                                timeout=config.SEEK_INDEX_TIMEOUT_SECONDS)
+    except Exception as e:
+        print(f"❌ 建立關鍵幀索引失敗: {e}")
+        return None
+
+    times = np.array([float(t) for t in _PTS_TIME_PATTERN.findall(result.stderr)], dtype=np.float64)
+    if times.size == 0:
+        print(f"⚠️ 無法從 ffmpeg 輸出解析關鍵幀: {os.path.basename(video_path)}")
+        return None
+
+    # 以第一個關鍵幀（串流起點）為 0，換算為幀索引
+    times = np.unique(times - times.min())
+    frames = np.round(times * fps)
+    index = np.stack([frames, times], axis=1)
+    print(f"✅ 關鍵幀索引建立完成: {len(index)} 個關鍵幀")
+    return index
+
+def save_seek_index(video_path, index):
+    """將索引存為 numpy sidecar 檔案，返回檔案路徑"""
+    if index is None:
+        return None
+    os.makedirs(config.INDEX_FOLDER, exist_ok=True)
+    path = seek_index_path(video_path)
+    np.save(path, index)
+    with _index_cache_lock:
+        _index_cache.pop(os.path.abspath(video_path), None)
+    return path
+
+def load_seek_index(video_path):
+    """讀取索引（記憶體快取），不存在時返回 None"""
+    key = os.path.abspath(video_path)
+    with _index_cache_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+
+    path = seek_index_path(video_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        index = np.load(path)
+    except Exception as e:
+        print(f"❌ 讀取關鍵幀索引失敗: {e}")
+        return None
+
+    with _index_cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+def get_keyframe_frames(video_path):
+    """返回關鍵幀的幀索引列表，供幀存取規劃使用；沒有索引時返回 None"""
+    index = load_seek_index(video_path)
+    if index is None or len(index) == 0:
+        return None
+    return index[:, 0].astype(np.int64).tolist()
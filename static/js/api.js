@@ -2,6 +2,13 @@
  * AdaptVideo API 相關函數
  */
 
+// 瀏覽器支援 WebP 時在 Accept 標頭中宣告，伺服器會改以 WebP 輸出預覽圖
+const PREVIEW_ACCEPT = (() => {
+    const canvas = document.createElement('canvas');
+    const supportsWebp = canvas.toDataURL('image/webp').startsWith('data:image/webp');
+    return supportsWebp ? 'application/json, image/webp' : 'application/json';
+})();
+
 // API 呼叫函數
 async function loadAllTemplates() {
     try {
@@ -110,7 +117,7 @@ async function triggerVideoAnalysis() {
     try {
         const analysisResponse = await fetch('/api/analyze', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Accept': PREVIEW_ACCEPT },
             body: JSON.stringify({
                 file_id: fileId,
                 conversation_history: conversationHistory
@@ -203,14 +210,15 @@ async function startConversion(template, center) {
     }
 }
 
-async function generatePreview(templateName, center) {
-    if (!fileId || !templateName) return;
+// 模板預覽快取：同一影片與主體選擇下，所有模板的預覽只需一次請求
+let templatePreviewCache = { key: null, results: {} };
+
+async function generateTemplatePreviews(center, templateNames) {
+    if (!fileId) return null;
     
     try {
-        const requestBody = {
-            file_id: fileId,
-            template_name: templateName
-        };
+        const requestBody = { file_id: fileId };
+        if (templateNames) requestBody.template_names = templateNames;
         
         if (center) {
             if (Array.isArray(selectedLLMSubjects) && selectedLLMSubjects.length > 0) {
@@ -220,9 +228,9 @@ async function generatePreview(templateName, center) {
             }
         }
         
-        const response = await fetch('/api/generate_preview', {
+        const response = await fetch('/api/template_previews', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Accept': PREVIEW_ACCEPT },
             body: JSON.stringify(requestBody)
         });
         
@@ -230,16 +238,35 @@ async function generatePreview(templateName, center) {
             throw new Error(`預覽生成失敗: ${response.status}`);
         }
         
-        const result = await response.json();
-        return result;
+        return await response.json();
         
     } catch (error) {
-        console.error('Preview generation error:', error);
+        console.error('Template previews error:', error);
         if (window.AdaptVideo && window.AdaptVideo.showStatus) window.AdaptVideo.showStatus('預覽生成失敗: ' + error.message, 'error');
         return null;
     }
 }
 
+async function generatePreview(templateName, center) {
+    if (!fileId || !templateName) return;
+    
+    const cacheKey = JSON.stringify([fileId, center, selectedLLMSubjects]);
+    if (templatePreviewCache.key !== cacheKey) {
+        templatePreviewCache = { key: cacheKey, results: {} };
+    }
+    
+    if (!templatePreviewCache.results[templateName]) {
+        // 第一次請求時一併取得所有模板的預覽，之後切換模板不需再請求
+        const result = await generateTemplatePreviews(center);
+        if (!result || templatePreviewCache.key !== cacheKey) return null;
+        result.templates.forEach(item => {
+            templatePreviewCache.results[item.template.name] = item;
+        });
+    }
+    
+    return templatePreviewCache.results[templateName] || null;
+}
+
 async function generateOriginalPreview() {
     if (!fileId) {
         if (window.AdaptVideo && window.AdaptVideo.showStatus) window.AdaptVideo.showStatus('請先選擇影片', 'error');
@@ -249,7 +276,7 @@ async function generateOriginalPreview() {
     try {
         const response = await fetch('/api/generate_original_preview', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Accept': PREVIEW_ACCEPT },
             body: JSON.stringify({ file_id: fileId })
         });
         
@@ -290,7 +317,7 @@ async function fetchOriginalPreviewData() {
     try {
         const response = await fetch('/api/generate_original_preview', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Accept': PREVIEW_ACCEPT },
             body: JSON.stringify({ file_id: currentFileId })
         });
         
@@ -312,7 +339,7 @@ async function generateConvertedPreview(fileId) {
     try {
         const response = await fetch('/api/generate_converted_preview', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Accept': PREVIEW_ACCEPT },
             body: JSON.stringify({ file_id: fileId })
         });
         
@@ -442,6 +469,7 @@ async function analyzeWithCustomRequirements(fileId, requirements, conversationH
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Accept': PREVIEW_ACCEPT,
             },
             body: JSON.stringify({
                 file_id: fileId,
@@ -477,6 +505,7 @@ window.AdaptVideoAPI = {
     triggerVideoAnalysis,
     startConversion,
     generatePreview,
+    generateTemplatePreviews,
     generateOriginalPreview,
     fetchOriginalPreviewData,
     generateConvertedPreview,
@@ -0,0 +1,177 @@
+"""
+AdaptVideo 主體追蹤模組
+"""
+import cv2
+import numpy as np
+from config import config
+from utils import subject_box_from_center
+from video_decoder import decoder_session
+from proxy_video import resolve_analysis_source
+
+def _read_gray_small(cap, scale):
+    """讀取目前幀並轉為降採樣灰階圖"""
+    ret, frame = cap.retrieve()
+    if not ret:
+        return None
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray
+
+def _match_in_window(gray, template, prev_xy, margin):
+    """在上一位置附近的搜尋視窗中進行模板匹配（prev_xy 為 None 時搜尋整張幀），返回 (左上角座標, 分數)"""
+    th, tw = template.shape[:2]
+    gh, gw = gray.shape[:2]
+    if prev_xy is None:
+        x0, y0, x1, y1 = 0, 0, gw, gh
+    else:
+        pad_x, pad_y = int(tw * margin), int(th * margin)
+        x0 = max(0, int(prev_xy[0]) - pad_x)
+        y0 = max(0, int(prev_xy[1]) - pad_y)
+        x1 = min(gw, int(prev_xy[0]) + tw + pad_x)
+        y1 = min(gh, int(prev_xy[1]) + th + pad_y)
+    window = gray[y0:y1, x0:x1]
+    if window.shape[0] < th or window.shape[1] < tw:
+        return prev_xy, 0.0
+    result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return (x0 + max_loc[0], y0 + max_loc[1]), float(max_val)
+
+def _follow(gray, template, prev_xy):
+    """
+    從上一位置追蹤到目前幀：先在附近視窗匹配，分數不足時改搜尋整張幀（主體可能被遮擋後在別處出現），
+    仍低於 TRACKING_MIN_SCORE 時保持上一位置
+    """
+    xy, score = _match_in_window(gray, template, prev_xy, config.TRACKING_SEARCH_MARGIN)
+    if score >= config.TRACKING_MIN_SCORE:
+        return xy
+    xy, score = _match_in_window(gray, template, None, config.TRACKING_SEARCH_MARGIN)
+    return xy if score >= config.TRACKING_MIN_SCORE else prev_xy
+
+def _iter_sampled_grays(cap, start, stop, step, last_frame, scale):
+    """從 start 循序 grab 到 stop（不含），只對取樣幀（step 的倍數與最後一幀）retrieve，yield (幀索引, 灰階圖)"""
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    for frame_idx in range(start, stop):
+        if not cap.grab():
+            return
+        if frame_idx % step == 0 or frame_idx == last_frame:
+            gray = _read_gray_small(cap, scale)
+            if gray is not None:
+                yield frame_idx, gray
+
+def _smooth(values, window):
+    """移動平均平滑，避免低解析度匹配造成的抖動"""
+    window = min(window, len(values))
+    if window <= 1:
+        return values
+    kernel = np.ones(window) / window
+    pad = window // 2
+    return np.convolve(np.pad(values, pad, mode='edge'), kernel, mode='valid')[:len(values)]
+
+def track_subjects(video_path, seeds, seed_frame=None):
+    """
+    以 LLM 中心點與縮圖框為種子，在低解析度幀上追蹤多個主體，返回與 seeds 對應的每幀中心點陣列 (N, 2)（失敗為 None）
+
+    主體在種子幀的位置已知，從種子幀開始往後、再分段往前追蹤；所有主體共用同一次解碼，
+    種子幀之前的幀以 TRACKING_BACKWARD_CHUNK 個取樣幀為一段讀取後反向追蹤，每幀仍只解碼一次
+
+    Args:
+        seeds: [(中心點, 主體框或 None)]，原始座標
+        seed_frame: 種子幀，預設與主體縮圖相同為中間幀
+    """
+    results = [None] * len(seeds)
+    if not seeds:
+        return results
+    # 有代理影片時在代理影片上追蹤，座標先換算為代理座標，最後再換算回原始座標
+    analysis_path, proxy_scale_x, proxy_scale_y = resolve_analysis_source(video_path)
+    with decoder_session(analysis_path) as (cap, meta):
+        if cap is None:
+            return results
+
+        width, height = meta['width'], meta['height']
+        total_frames = meta['frame_count']
+        if width <= 0 or height <= 0 or total_frames <= 0:
+            return results
+        if seed_frame is None:
+            seed_frame = total_frames // 2
+        seed_frame = min(max(0, int(seed_frame)), total_frames - 1)
+
+        scale = min(1.0, config.TRACKING_MAX_WIDTH / width)
+        step = max(1, config.TRACKING_FRAME_STEP)
+        last_frame = total_frames - 1
+
+        # 從種子幀擷取每個主體的模板
+        cap.set(cv2.CAP_PROP_POS_FRAMES, seed_frame)
+        if not cap.grab():
+            return results
+        seed_gray = _read_gray_small(cap, scale)
+        if seed_gray is None:
+            return results
+
+        subjects = []   # (seeds 中的索引, 模板, 種子位置, 中心點相對框左上角的偏移（代理座標）)
+        for i, (center, box) in enumerate(seeds):
+            if box is None:
+                box = subject_box_from_center(center, width / proxy_scale_x, height / proxy_scale_y)
+            center = (center[0] * proxy_scale_x, center[1] * proxy_scale_y)
+            box = [box[0] * proxy_scale_x, box[1] * proxy_scale_y, box[2] * proxy_scale_x, box[3] * proxy_scale_y]
+            x1, y1, x2, y2 = [int(round(v * scale)) for v in box]
+            template = seed_gray[max(0, y1):y2, max(0, x1):x2]
+            if template.size == 0 or min(template.shape[:2]) < 4:
+                print(f"⚠️ 追蹤模板無效: {box}")
+                continue
+            subjects.append((i, template, (max(0, x1), max(0, y1)), (center[0] - box[0], center[1] - box[1])))
+        if not subjects:
+            return results
+
+        # 每個主體的取樣位置（縮圖座標的模板左上角），種子幀固定為已知位置
+        samples = [{seed_frame: seed_xy} for _, _, seed_xy, _ in subjects]
+
+        # 往後：從種子幀循序讀到結尾
+        prev = [seed_xy for _, _, seed_xy, _ in subjects]
+        end_frame = seed_frame + 1
+        for frame_idx, gray in _iter_sampled_grays(cap, seed_frame + 1, total_frames, step, last_frame, scale):
+            for k, (_, template, _, _) in enumerate(subjects):
+                prev[k] = _follow(gray, template, prev[k])
+                samples[k][frame_idx] = prev[k]
+            end_frame = frame_idx + 1
+
+        # 往前：分段循序讀取種子幀之前的取樣幀，再反向追蹤
+        prev = [seed_xy for _, _, seed_xy, _ in subjects]
+        chunk_end = seed_frame
+        chunk_frames = max(1, config.TRACKING_BACKWARD_CHUNK) * step
+        while chunk_end > 0:
+            chunk_start = max(0, chunk_end - chunk_frames)
+            grays = list(_iter_sampled_grays(cap, chunk_start, chunk_end, step, last_frame, scale))
+            for frame_idx, gray in reversed(grays):
+                for k, (_, template, _, _) in enumerate(subjects):
+                    prev[k] = _follow(gray, template, prev[k])
+                    samples[k][frame_idx] = prev[k]
+            chunk_end = chunk_start
+
+    # 以實際解碼的幀數為準，容器宣告的幀數可能不準確
+    frames = np.arange(max(end_frame, seed_frame + 1))
+    for (i, template, _, offset), sampled in zip(subjects, samples):
+        sample_indices = sorted(sampled)
+        # 轉回代理座標並內插到每一幀
+        positions = np.asarray([sampled[f] for f in sample_indices], dtype=np.float64) / scale
+        xs = _smooth(np.interp(frames, sample_indices, positions[:, 0]) + offset[0], config.TRACKING_SMOOTH_WINDOW)
+        ys = _smooth(np.interp(frames, sample_indices, positions[:, 1]) + offset[1], config.TRACKING_SMOOTH_WINDOW)
+        track = np.stack([np.clip(xs, 0, width), np.clip(ys, 0, height)], axis=1) / [proxy_scale_x, proxy_scale_y]
+        # 種子幀的位置已知，不受平滑影響
+        track[seed_frame] = seeds[i][0]
+        results[i] = track
+        th, tw = template.shape[:2]
+        print(f"✅ 主體追蹤完成: {len(track)} 幀, 取樣 {len(sample_indices)} 次, 模板 {tw}x{th}")
+    return results
+
+def combine_tracks(tracks, weights=None):
+    """將多個主體的追蹤軌跡按權重合併為單一軌跡"""
+    tracks = [t for t in tracks if t is not None and len(t) > 0]
+    if not tracks:
+        return None
+    length = min(len(t) for t in tracks)
+    stacked = np.stack([t[:length] for t in tracks])
+    if weights is None or len(weights) != len(stacked) or sum(weights) <= 0:
+        return stacked.mean(axis=0)
+    return np.average(stacked, axis=0, weights=np.asarray(weights, dtype=np.float64))
@@ -0,0 +1,119 @@
+"""
+AdaptVideo DOOH 模板登錄模組（以 id / 名稱索引，支援檔案載入與租戶自訂模板）
+"""
+import os
+import json
+import threading
+from config import config
+
+_registry_lock = threading.Lock()
+_builtin = None        # {"templates": [...], "by_id": {...}, "by_name": {...}}
+_tenants = None        # 租戶 -> 同上結構
+
+def _normalize(template, tenant=None):
+    """補齊模板欄位；沒有 id 時以 (租戶, 尺寸) 產生穩定 id"""
+    width, height = int(template['width']), int(template['height'])
+    template_id = template.get('id') or (f"{tenant}/{width}x{height}" if tenant else f"size-{width}x{height}")
+    normalized = {
+        "id": str(template_id),
+        "name": template.get('name') or f"{width}x{height}",
+        "width": width,
+        "height": height,
+        "description": template.get('description', '')
+    }
+    if tenant:
+        normalized["tenant"] = tenant
+    return normalized
+
+def _index(templates):
+    """建立 id 與名稱的查詢索引"""
+    return {
+        "templates": templates,
+        "by_id": {t['id']: t for t in templates},
+        "by_name": {t['name']: t for t in templates}
+    }
+
+def _read_json(path):
+    """讀取 JSON 檔案，不存在或格式錯誤時返回 None"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"❌ 讀取模板檔案失敗: {path}: {e}")
+        return None
+
+def _load():
+    """載入內建模板（TEMPLATES_FILE 存在時取代 DOOH_TEMPLATES）與 TENANT_TEMPLATES_FILE 的租戶自訂模板（需持有鎖）"""
+    global _builtin, _tenants
+    if _builtin is not None:
+        return
+
+    loaded = _read_json(config.TEMPLATES_FILE)
+    templates = loaded.get('templates', []) if isinstance(loaded, dict) else loaded
+    if templates:
+        print(f"✅ 已從檔案載入 {len(templates)} 個模板: {os.path.basename(config.TEMPLATES_FILE)}")
+    else:
+        templates = config.DOOH_TEMPLATES
+    _builtin = _index([_normalize(t) for t in templates])
+
+    tenants = _read_json(config.TENANT_TEMPLATES_FILE) or {}
+    _tenants = {
+        tenant: _index([_normalize(t, tenant) for t in items])
+        for tenant, items in tenants.items()
+    }
+
+def get_templates(tenant=None):
+    """返回內建模板加上租戶的自訂模板"""
+    with _registry_lock:
+        _load()
+        custom = _tenants.get(tenant) if tenant else None
+        return list(_builtin['templates']) + (list(custom['templates']) if custom else [])
+
+def get_template(key, tenant=None):
+    """以 id 或名稱查詢模板（租戶自訂模板優先），找不到時返回 None"""
+    if not key:
+        return None
+    with _registry_lock:
+        _load()
+        indexes = ([_tenants[tenant]] if tenant in _tenants else []) + [_builtin]
+        for index in indexes:
+            template = index['by_id'].get(key) or index['by_name'].get(key)
+            if template is not None:
+                return template
+    return None
+
+def find_templates(keys, tenant=None):
+    """依 id 或名稱查詢多個模板，保留 get_templates 的順序並略過找不到的"""
+    keys = set(keys or [])
+    return [t for t in get_templates(tenant) if t['id'] in keys or t['name'] in keys]
+
+def resolve_size_template(width, height, tenant=None):
+    """以尺寸找出已登錄的模板；沒有時返回臨時模板（id 為 size-寬x高），讓任意尺寸也有穩定 id"""
+    width, height = int(width), int(height)
+    for template in reversed(get_templates(tenant)):
+        if template['width'] == width and template['height'] == height:
+            return template
+    return _normalize({"width": width, "height": height})
+
+def add_custom_template(tenant, name, width, height, description=''):
+    """新增（或以相同尺寸更新）租戶自訂模板並寫入 TENANT_TEMPLATES_FILE，返回模板"""
+    template = _normalize({"name": name, "width": width, "height": height, "description": description}, tenant)
+    with _registry_lock:
+        _load()
+        existing = _tenants[tenant]['templates'] if tenant in _tenants else []
+        templates = [t for t in existing if t['id'] != template['id']] + [template]
+        _tenants[tenant] = _index(templates)
+
+        stored = {
+            tenant_name: [{k: v for k, v in t.items() if k != 'tenant'} for t in index['templates']]
+            for tenant_name, index in _tenants.items()
+        }
+        partial_path = f"{config.TENANT_TEMPLATES_FILE}.{os.getpid()}.partial"
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            json.dump(stored, f, ensure_ascii=False, indent=2)
+        os.replace(partial_path, config.TENANT_TEMPLATES_FILE)
+
+    print(f"✅ 已新增租戶模板: {tenant} / {template['name']} ({template['width']}x{template['height']})")
+    return template
@@ -0,0 +1,84 @@
+"""
+AdaptVideo 時間軸縮圖模組（單次循序讀取產生整條縮圖）
+"""
+from config import config
+from video_decoder import decoder_session
+from frame_access import read_frames, read_frames_sequential, ACCESS_FAST
+from seek_index import get_keyframe_frames
+from proxy_video import get_proxy
+from video_processing import sample_frame_indices, resize_to_max_width
+from preview_store import publish_sprite_sheet
+
+MODE_SEQUENTIAL = 'sequential'
+MODE_KEYFRAMES = 'keyframes'
+
+def resolve_strip_mode(video_path, mode=None):
+    """未指定時：有代理影片（全 I 幀、解碼便宜）就循序讀取代理影片，否則只讀取關鍵幀附近的幀"""
+    if mode in (MODE_SEQUENTIAL, MODE_KEYFRAMES):
+        return mode
+    return MODE_SEQUENTIAL if get_proxy(video_path) is not None else MODE_KEYFRAMES
+
+def strip_cache_key(count, thumb_width, mode, mimetype):
+    """時間軸縮圖的快取鍵（同一影片內區分參數）"""
+    return f"{count}:{thumb_width}:{mode}:{mimetype}"
+
+def _iter_strip_frames(video_path, count, mode):
+    """依模式讀取 count 個均勻分布的幀，yield (實際幀索引, 時間(秒), BGR 幀)；同一幀只 yield 一次"""
+    if mode == MODE_SEQUENTIAL:
+        proxy = get_proxy(video_path)
+        source_path = proxy[0] if proxy is not None else video_path
+    else:
+        source_path = video_path
+
+    with decoder_session(source_path) as (cap, meta):
+        if cap is None or meta['frame_count'] <= 0:
+            return
+        fps = meta['fps'] or 30
+        frame_indices = sample_frame_indices(meta['frame_count'], min(count, meta['frame_count']))
+        if mode == MODE_SEQUENTIAL:
+            frames = read_frames_sequential(cap, meta, frame_indices)
+        else:
+            # 以附近的關鍵幀代替，不需解碼 GOP 中間的幀；索引與時間以實際讀取的關鍵幀為準，
+            # 多個取樣點對應到同一個關鍵幀時只保留一張
+            frames = read_frames(cap, meta, frame_indices, mode=ACCESS_FAST,
+                                 keyframes=get_keyframe_frames(source_path), unique=True)
+        for frame_idx, frame in frames:
+            yield frame_idx, round(frame_idx / fps, 3), frame
+
+def build_timeline_strip(video_path, count=None, thumb_width=None, mode=None, mimetype='image/jpeg'):
+    """
+    產生均勻分布的時間軸縮圖，拼成一張 sprite sheet（寫入預覽資源儲存區）
+
+    Returns:
+        dict: {"image": URL, "width", "height", "mode", "frames": [{"x", "y", "width", "height", "frame", "time"}]}；
+              無法讀取影片時返回 None
+    """
+    if count is None:
+        count = config.TIMELINE_STRIP_COUNT
+    if thumb_width is None:
+        thumb_width = config.TIMELINE_THUMB_WIDTH
+    mode = resolve_strip_mode(video_path, mode)
+
+    entries = []
+    thumbnails = []
+    for frame_idx, time, frame in _iter_strip_frames(video_path, count, mode):
+        thumbnails.append(resize_to_max_width(frame, thumb_width))
+        entries.append({"frame": frame_idx, "time": time})
+    if not thumbnails:
+        return None
+
+    columns = max(1, config.TIMELINE_STRIP_COLUMNS)
+    rows = [thumbnails[i:i + columns] for i in range(0, len(thumbnails), columns)]
+    sprite = publish_sprite_sheet(
+        rows, quality=config.PREVIEW_IMAGE_QUALITY['timeline_strip'], mimetype=mimetype
+    )
+    rects = [rect for row in sprite['rows'] for rect in row]
+
+    print(f"✅ 時間軸縮圖建立完成: {len(thumbnails)} 張 ({mode})")
+    return {
+        "image": sprite['image'],
+        "width": sprite['width'],
+        "height": sprite['height'],
+        "mode": mode,
+        "frames": [{**rect, **entry} for rect, entry in zip(rects, entries)]
+    }
@@ -36,6 +36,13 @@ def validate_json_request(required_params=None):
         return wrapper
     return decorator
 
+def get_request_tenant():
+    """取得請求的租戶（X-Tenant-ID 標頭、查詢參數或 JSON 的 tenant），沒有時返回 None"""
+    tenant = request.headers.get('X-Tenant-ID') or request.args.get('tenant')
+    if not tenant and request.is_json:
+        tenant = (request.get_json(silent=True) or {}).get('tenant')
+    return tenant or None
+
 def generate_unique_filename(original_filename, file_id=None):
     """生成唯一的檔案名稱"""
     if file_id is None:
@@ -65,6 +72,43 @@ def validate_file_size(file_path):
     max_size_mb = config.MAX_FILE_SIZE / (1024 * 1024)
     return size_mb <= max_size_mb
 
+def subject_box_from_center(center, video_width, video_height, box_size=None):
+    """以主體中心點建立裁切框 (x1, y1, x2, y2)，並確保在影片範圍內"""
+    if box_size is None:
+        box_size = config.SUBJECT_BOX_SIZE
+    x, y = center
+    x1 = max(0, int(x - box_size / 2))
+    y1 = max(0, int(y - box_size / 2))
+    x2 = min(int(video_width), int(x + box_size / 2))
+    y2 = min(int(video_height), int(y + box_size / 2))
+    return (x1, y1, x2, y2)
+
+def get_subject_boxes(analysis_options, video_width, video_height):
+    """返回分析結果中所有主體的框 (x1, y1, x2, y2)，沒有框的主體以中心點建立"""
+    return [
+        option.get('box') or subject_box_from_center(option['center'], video_width, video_height)
+        for option in analysis_options or []
+        if option.get('center')
+    ]
+
+def get_subject_weight(center, analysis_options):
+    """根據 LLM 分析選項的重要性和信心度計算主體權重，返回 (權重, 重要性, 信心度)"""
+    importance = 'medium'  # 預設值
+    confidence = 0.8       # 預設值
+    
+    for option in analysis_options:
+        if option.get('center') == center:
+            importance = option.get('importance', 'medium')
+            confidence = option.get('confidence', 0.8)
+            break
+    
+    # 重要性權重
+    importance_weights = {'high': 3, 'medium': 2, 'low': 1}
+    importance_weight = importance_weights.get(importance, 2)
+    
+    # 最終權重 = 重要性權重 × 信心度
+    return importance_weight * confidence, importance, confidence
+
 def calculate_multi_subject_center(selected_centers, analysis_options):
     """計算多個主體的加權中心點"""
     if not selected_centers or len(selected_centers) == 0:
@@ -79,21 +123,7 @@ def calculate_multi_subject_center(selected_centers, analysis_options):
     
     for center in selected_centers:
         # 找到對應的分析選項以獲取重要性和信心度
-        importance = 'medium'  # 預設值
-        confidence = 0.8       # 預設值
-        
-        for option in analysis_options:
-            if option.get('center') == center:
-                importance = option.get('importance', 'medium')
-                confidence = option.get('confidence', 0.8)
-                break
-        
-        # 重要性權重
-        importance_weights = {'high': 3, 'medium': 2, 'low': 1}
-        importance_weight = importance_weights.get(importance, 2)
-        
-        # 最終權重 = 重要性權重 × 信心度
-        weight = importance_weight * confidence
+        weight, importance, confidence = get_subject_weight(center, analysis_options)
         
         total_weighted_x += center[0] * weight
         total_weighted_y += center[1] * weight
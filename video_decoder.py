@@ -0,0 +1,158 @@
+"""
+AdaptVideo 影片解碼器工作階段池
+"""
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import cv2
+from config import config
+
+def _file_signature(video_path):
+    """以絕對路徑、修改時間與檔案大小識別檔案，檔案被覆寫時快取自動失效"""
+    abs_path = os.path.abspath(video_path)
+    try:
+        stat = os.stat(abs_path)
+        return (abs_path, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return (abs_path, 0, 0)
+
+def _read_metadata(cap):
+    """讀取已開啟 capture 的基本資訊"""
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    return {
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "frame_count": frame_count,
+        "duration": frame_count / fps if fps > 0 else 0
+    }
+
+class DecoderPool:
+    """以 LRU 管理已開啟的 cv2.VideoCapture，依數量與估計記憶體上限回收"""
+
+    def __init__(self, max_sessions=None, max_memory_mb=None, max_metadata_entries=256):
+        self.max_sessions = max_sessions or config.DECODER_POOL_MAX_SESSIONS
+        self.max_memory = (max_memory_mb or config.DECODER_POOL_MAX_MEMORY_MB) * 1024 * 1024
+        self.max_metadata_entries = max_metadata_entries
+        self._idle = OrderedDict()      # (signature, 序號) -> (capture, 估計記憶體)
+        self._metadata = OrderedDict()  # signature -> metadata
+        self._idle_memory = 0
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _estimate_memory(self, metadata):
+        """估計一個解碼器工作階段佔用的記憶體（參考幀緩衝）"""
+        return metadata['width'] * metadata['height'] * 3 * config.DECODER_BUFFER_FRAMES
+
+    def _remember_metadata(self, signature, metadata):
+        self._metadata[signature] = metadata
+        self._metadata.move_to_end(signature)
+        while len(self._metadata) > self.max_metadata_entries:
+            self._metadata.popitem(last=False)
+
+    def _evict(self):
+        """回收最久未使用的閒置工作階段直到符合上限（需持有鎖）"""
+        released = []
+        while self._idle and (len(self._idle) > self.max_sessions or self._idle_memory > self.max_memory):
+            _, (cap, memory) = self._idle.popitem(last=False)
+            self._idle_memory -= memory
+            released.append(cap)
+        return released
+
+    def checkout(self, video_path):
+        """取出一個專屬的 capture，返回 (capture, metadata)；無法開啟時 capture 為 None"""
+        signature = _file_signature(video_path)
+        stale = []
+        with self._lock:
+            for key in list(self._idle):
+                if key[0][0] == signature[0] and key[0] != signature:
+                    # 同一路徑的檔案已被覆寫
+                    cap, memory = self._idle.pop(key)
+                    self._idle_memory -= memory
+                    stale.append(cap)
+            key = next((k for k in reversed(self._idle) if k[0] == signature), None)
+            if key is not None:
+                cap, memory = self._idle.pop(key)
+                self._idle_memory -= memory
+                metadata = self._metadata.get(signature)
+            else:
+                cap = None
+        for old in stale:
+            old.release()
+
+        if cap is None:
+            cap = cv2.VideoCapture(signature[0])
+            if not cap.isOpened():
+                cap.release()
+                return None, None
+            metadata = _read_metadata(cap)
+            with self._lock:
+                self._remember_metadata(signature, metadata)
+        elif metadata is None:
+            metadata = _read_metadata(cap)
+        return cap, metadata
+
+    def checkin(self, video_path, cap):
+        """歸還 capture 供後續請求重用"""
+        if cap is None:
+            return
+        signature = _file_signature(video_path)
+        with self._lock:
+            metadata = self._metadata.get(signature)
+            if metadata is None or not cap.isOpened():
+                released = [cap]
+            else:
+                self._counter += 1
+                memory = self._estimate_memory(metadata)
+                self._idle[(signature, self._counter)] = (cap, memory)
+                self._idle_memory += memory
+                released = self._evict()
+        for old in released:
+            old.release()
+
+    def get_metadata(self, video_path):
+        """獲取影片基本資訊（幀數、fps、尺寸），優先使用快取"""
+        signature = _file_signature(video_path)
+        with self._lock:
+            metadata = self._metadata.get(signature)
+            if metadata is not None:
+                self._metadata.move_to_end(signature)
+                return dict(metadata)
+        cap, metadata = self.checkout(video_path)
+        self.checkin(video_path, cap)
+        return dict(metadata) if metadata else None
+
+    def invalidate(self, video_path):
+        """釋放某個檔案的所有閒置工作階段與快取資訊"""
+        abs_path = os.path.abspath(video_path)
+        with self._lock:
+            keys = [k for k in self._idle if k[0][0] == abs_path]
+            released = []
+            for key in keys:
+                cap, memory = self._idle.pop(key)
+                self._idle_memory -= memory
+                released.append(cap)
+            for signature in [s for s in self._metadata if s[0] == abs_path]:
+                del self._metadata[signature]
+        for cap in released:
+            cap.release()
+
+# 全域解碼器池
+decoder_pool = DecoderPool()
+
+@contextmanager
+def decoder_session(video_path):
+    """從解碼器池取出 capture 的 context manager，yield (capture, metadata)"""
+    cap, metadata = decoder_pool.checkout(video_path)
+    try:
+        yield cap, metadata
+    finally:
+        decoder_pool.checkin(video_path, cap)
+
+def get_video_metadata(video_path):
+    """獲取快取的影片基本資訊，無法開啟時返回 None"""
+    return decoder_pool.get_metadata(video_path)
@@ -10,10 +10,19 @@ import uuid
 import shutil
 import time
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import httpx
 from openai import OpenAI
 from config import config
+from video_decoder import decoder_session, get_video_metadata
+from frame_access import read_frames, ACCESS_EXACT, ACCESS_FAST
+from seek_index import get_keyframe_frames
+from proxy_video import resolve_analysis_source
+from frame_cache import iter_cached_frames
+from preview_store import publish_image
+from template_registry import get_templates
+from crop_geometry import crop_scale, plan_crops, compute_crop_rect, compute_dynamic_crop_offsets
 
 # 初始化 OpenAI 用戶端
 try:
@@ -64,19 +73,21 @@ def get_video_info(file_path):
         print(f"獲取影片信息失敗: {e}")
         return {"duration": 0, "width": 0, "height": 0, "fps": 0}
 
+def read_middle_frame(video_path):
+    """透過關鍵幀索引直接定位並讀取影片中間幀"""
+    with decoder_session(video_path) as (cap, meta):
+        if cap is None or meta['frame_count'] <= 0:
+            return None
+        keyframes = get_keyframe_frames(video_path)
+        for _, frame in read_frames(cap, meta, [meta['frame_count'] // 2], keyframes=keyframes):
+            return frame
+    return None
+
 def extract_thumbnail(video_path):
     """從影片中間提取一幀作為縮圖"""
     try:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            return None
-        
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames // 2)
-        ret, frame = cap.read()
-        cap.release()
-        
-        if not ret:
+        frame = read_middle_frame(video_path)
+        if frame is None:
             return None
         
         _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, config.DEFAULT_JPEG_QUALITY])
@@ -85,139 +96,184 @@ def extract_thumbnail(video_path):
         print(f"❌ 提取縮圖失敗: {e}")
         return None
 
+def detect_main_face_center(frame):
+    """偵測單一幀中面積最大的人臉，返回其中心點或 None"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+    
+    if len(faces) == 0:
+        return None
+    main_face = max(faces, key=lambda r: r[2] * r[3])
+    return (main_face[0] + main_face[2] / 2, main_face[1] + main_face[3] / 2)
+
 def analyze_video_for_face_crop(video_path):
     """分析影片，找到主要人臉的平均中心位置"""
     if not OPENCV_AI_AVAILABLE:
         return None
     
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        return None
-
     face_positions = []
     max_frames_to_check = config.MAX_FRAMES_FOR_ANALYSIS
     frame_count = 0
     
-    while cap.isOpened() and frame_count < max_frames_to_check:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-        
-        if len(faces) > 0:
-            main_face = max(faces, key=lambda r: r[2] * r[3])
-            face_positions.append((main_face[0] + main_face[2] / 2, main_face[1] + main_face[3] / 2))
+    # 在代理影片上偵測，結果換算回原始座標
+    analysis_path, scale_x, scale_y = resolve_analysis_source(video_path)
+    with decoder_session(analysis_path) as (cap, _):
+        if cap is None:
+            return None
         
-        frame_count += 1
-    
-    cap.release()
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        while frame_count < max_frames_to_check:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            
+            face_center = detect_main_face_center(frame)
+            if face_center is not None:
+                face_positions.append(face_center)
+            
+            frame_count += 1
 
     if not face_positions:
         print("ℹ️ 在影片中未偵測到人臉")
         return None
     
-    avg_pos = np.mean(face_positions, axis=0)
+    avg_pos = np.mean(face_positions, axis=0) / [scale_x, scale_y]
     print(f"✅ AI分析完成，平均人臉中心: ({avg_pos[0]:.0f}, {avg_pos[1]:.0f})")
     return avg_pos
 
-def extract_frames_generic(video_path, num_frames, return_pil=False, max_width=None, quality=85):
-    """通用的幀提取函數，可返回 base64 或 PIL Image"""
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        return []
+def compute_scene_centers(video_path, scenes, default_center, samples_per_scene=3):
+    """為每個場景偵測主體中心點，偵測不到時使用 default_center"""
+    centers = [list(default_center) for _ in scenes]
+    if not OPENCV_AI_AVAILABLE or not scenes:
+        return centers
     
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    if total_frames <= 0:
-        cap.release()
-        return []
+    analysis_path, scale_x, scale_y = resolve_analysis_source(video_path)
+    with decoder_session(analysis_path) as (cap, meta):
+        if cap is None:
+            return centers
+        
+        keyframes = get_keyframe_frames(analysis_path)
+        for i, scene in enumerate(scenes):
+            start, end = scene['start_frame'], scene['end_frame']
+            length = max(1, end - start)
+            sample_indices = [start + int((k + 0.5) * length / samples_per_scene) for k in range(samples_per_scene)]
+            positions = []
+            for _, frame in read_frames(cap, meta, sample_indices, keyframes=keyframes):
+                face_center = detect_main_face_center(frame)
+                if face_center is not None:
+                    positions.append(face_center)
+            if positions:
+                centers[i] = (np.mean(positions, axis=0) / [scale_x, scale_y]).tolist()
+                print(f"🎬 場景 {i}: 偵測到主體中心 ({centers[i][0]:.0f}, {centers[i][1]:.0f})")
     
-    # 計算要提取的幀索引
-    frame_indices = []
+    return centers
+
+def sample_frame_indices(total_frames, num_frames):
+    """在影片中均勻取樣 num_frames 個幀索引（包含首尾幀）"""
     if num_frames > 1 and total_frames > 1:
-        for i in range(num_frames):
-            frame_idx = int(i * (total_frames - 1) / (num_frames - 1))
-            frame_indices.append(min(frame_idx, total_frames - 1))
-    else:
-        frame_indices = [0]
+        return [min(int(i * (total_frames - 1) / (num_frames - 1)), total_frames - 1) for i in range(num_frames)]
+    return [0]
+
+def iter_sampled_frames(video_path, num_frames, access_mode=ACCESS_EXACT, use_proxy=False):
+    """依幀索引遞增順序逐一 yield 均勻取樣的 (幀索引, BGR 幀)；use_proxy 時從代理解析度的幀快取讀取"""
+    metadata = get_video_metadata(video_path)
+    if not metadata or metadata['frame_count'] <= 0:
+        return
+    frame_indices = sample_frame_indices(metadata['frame_count'], num_frames)
     
-    frames = []
-    for frame_idx in frame_indices:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-        ret, frame = cap.read()
-        if not ret:
-            continue
-        
-        if return_pil:
-            # 轉換為 PIL Image
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-            
-            # 如果指定最大寬度，調整大小
-            if max_width and img.width > max_width:
-                scale = max_width / img.width
-                new_width = int(img.width * scale)
-                new_height = int(img.height * scale)
-                img = img.resize((new_width, new_height), Image.LANCZOS)
-            
-            frames.append(img)
-        else:
-            # 返回 base64
-            _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
-            frames.append(base64.b64encode(buffer).decode("utf-8"))
+    if use_proxy:
+        # 預覽幀直接切片 memmap 快取，不需再經過解碼器
+        yield from iter_cached_frames(video_path, frame_indices)
+        return
     
-    cap.release()
-    return frames
+    with decoder_session(video_path) as (cap, meta):
+        if cap is None:
+            return
+        keyframes = get_keyframe_frames(video_path)
+        yield from read_frames(cap, meta, frame_indices, mode=access_mode, keyframes=keyframes)
 
-def apply_smart_crop(image, target_width, target_height, center, original_width=None, original_height=None):
-    """應用智慧裁切邏輯，返回裁切後的圖像和是否被調整的標記"""
-    if isinstance(image, np.ndarray):
-        # OpenCV 格式轉 PIL
-        image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-    
-    # 獲取原始尺寸
+def resize_to_max_width(frame, max_width):
+    """等比例縮小 BGR 幀至不超過 max_width（不放大）"""
+    height, width = frame.shape[:2]
+    if not max_width or width <= max_width:
+        return frame
+    scale = max_width / width
+    return cv2.resize(frame, (max_width, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+FRAME_BGR = 'bgr'
+FRAME_RGB = 'rgb'
+FRAME_JPEG = 'jpeg'
+
+def iter_frames(video_path, num_frames, output=FRAME_BGR, max_width=None, quality=85, access_mode=ACCESS_EXACT, use_proxy=False):
+    """
+    逐一 yield 均勻取樣的 (幀索引, 幀)，每幀處理完即可釋放，同一時間只需保留一幀
+
+    Args:
+        output: 'bgr'（numpy BGR 陣列）、'rgb'（numpy RGB 陣列）或 'jpeg'（已編碼的 JPEG bytes）
+        max_width: 先以 INTER_AREA 縮小至不超過此寬度，再轉換色彩或編碼
+        quality: output 為 'jpeg' 時的品質
+    """
+    for frame_idx, frame in iter_sampled_frames(video_path, num_frames, access_mode=access_mode, use_proxy=use_proxy):
+        frame = resize_to_max_width(frame, max_width)
+        if output == FRAME_RGB:
+            yield frame_idx, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        elif output == FRAME_JPEG:
+            _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+            yield frame_idx, buffer.tobytes()
+        else:
+            yield frame_idx, frame
+
+def extract_frames_generic(video_path, num_frames, return_pil=False, max_width=None, quality=85, access_mode=ACCESS_EXACT, use_proxy=False):
+    """通用的幀提取函數，可返回 base64 或 PIL Image（會保留所有幀，逐幀處理請使用 iter_frames）；access_mode='fast' 時允許以附近的幀代替，use_proxy 時從代理解析度的幀快取讀取"""
+    options = dict(max_width=max_width, access_mode=access_mode, use_proxy=use_proxy)
+    if return_pil:
+        return [Image.fromarray(frame) for _, frame in iter_frames(video_path, num_frames, output=FRAME_RGB, **options)]
+    return [
+        base64.b64encode(data).decode("utf-8")
+        for _, data in iter_frames(video_path, num_frames, output=FRAME_JPEG, quality=quality, **options)
+    ]
+
+def smart_crop_frame(frame, target_width, target_height, center, original_width=None, original_height=None):
+    """numpy 版智慧裁切：直接從 BGR 幀裁切原始座標的區域並縮放到模板尺寸（不先縮放整張幀），返回 (BGR 幀, 是否被調整)"""
+    frame_h, frame_w = frame.shape[:2]
     if original_width is None:
-        original_width = image.width
+        original_width = frame_w
     if original_height is None:
-        original_height = image.height
-    
-    # 計算縮放比例
-    scale = max(target_width / original_width, target_height / original_height)
-    resized_w = int(original_width * scale)
-    resized_h = int(original_height * scale)
-    
-    # 縮放圖像
-    resized_img = image.resize((resized_w, resized_h), Image.LANCZOS)
-    
-    # 計算裁切中心點
-    desired_center_x = center[0] * scale
-    desired_center_y = center[1] * scale
-    
-    # 計算安全範圍
-    half_w = target_width / 2
-    half_h = target_height / 2
-    min_x = half_w
-    max_x = resized_w - half_w
-    min_y = half_h
-    max_y = resized_h - half_h
-    
-    # 確保中心點在安全範圍內
-    final_crop_x = max(min_x, min(desired_center_x, max_x))
-    final_crop_y = max(min_y, min(desired_center_y, max_y))
-    
-    # 檢查是否被調整
-    is_adjusted = abs(final_crop_x - desired_center_x) > 1 or abs(final_crop_y - desired_center_y) > 1
-    
-    # 進行裁切
-    left = int(final_crop_x - half_w)
-    top = int(final_crop_y - half_h)
-    right = int(final_crop_x + half_w)
-    bottom = int(final_crop_y + half_h)
-    
-    cropped_img = resized_img.crop((left, top, right, bottom))
-    
-    return cropped_img, is_adjusted
+        original_height = frame_h
+    crop_rect, is_adjusted = compute_crop_rect(original_width, original_height, target_width, target_height, center)
+    return crop_to_preview(frame, crop_rect, (target_width, target_height), original_width, original_height), is_adjusted
+
+def apply_smart_crop(image, target_width, target_height, center, original_width=None, original_height=None):
+    """應用智慧裁切邏輯，返回裁切後的圖像和是否被調整的標記（numpy BGR 輸入返回 numpy BGR，PIL 輸入才返回 PIL）"""
+    if isinstance(image, np.ndarray):
+        return smart_crop_frame(image, target_width, target_height, center, original_width, original_height)
+
+    # PIL 輸入：以 OpenCV 裁切縮放後再轉回 PIL
+    frame = cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+    cropped, is_adjusted = smart_crop_frame(frame, target_width, target_height, center, original_width, original_height)
+    return Image.fromarray(cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)), is_adjusted
+
+def preview_size(target_width, target_height, max_width=None, max_height=180):
+    """模板預覽圖的顯示尺寸（不放大）"""
+    if max_width is None:
+        max_width = config.DEFAULT_CROP_PREVIEW_MAX_WIDTH
+    preview_scale = min(max_width / target_width, max_height / target_height)
+    if preview_scale >= 1:
+        return target_width, target_height
+    return int(target_width * preview_scale), int(target_height * preview_scale)
+
+def crop_to_preview(frame, crop_rect, output_size, original_width, original_height):
+    """從原始或代理幀直接裁切原始座標的區域並縮放到輸出尺寸（縮小用 INTER_AREA，放大才用 Lanczos），不經過模板解析度"""
+    frame_h, frame_w = frame.shape[:2]
+    scale_x = frame_w / original_width
+    scale_y = frame_h / original_height
+    x1 = min(max(0, int(round(crop_rect[0] * scale_x))), frame_w - 1)
+    y1 = min(max(0, int(round(crop_rect[1] * scale_y))), frame_h - 1)
+    x2 = max(x1 + 1, min(frame_w, int(round(crop_rect[2] * scale_x))))
+    y2 = max(y1 + 1, min(frame_h, int(round(crop_rect[3] * scale_y))))
+    region = frame[y1:y2, x1:x2]
+    interpolation = cv2.INTER_AREA if region.shape[1] >= output_size[0] else cv2.INTER_LANCZOS4
+    return cv2.resize(region, output_size, interpolation=interpolation)
 
 def analyze_video_with_llm(video_path, conversation_history, original_width=None, original_height=None):
     """使用多模態LLM分析影片，基於提供的對話歷史"""
@@ -231,7 +287,7 @@ def analyze_video_with_llm(video_path, conversation_history, original_width=None
         
     print(f"🧠 已提取 {len(base64_frames)} 幀，準備基於對話歷史進行LLM分析...")
 
-    template_descriptions = "\\n".join([f"- {t['name']}: {t['width']}x{t['height']} ({t['description']})" for t in config.DOOH_TEMPLATES])
+    template_descriptions = "\\n".join([f"- {t['name']}: {t['width']}x{t['height']} ({t.get('description', '')})" for t in get_templates()])
     
     # 如果有提供原始影片尺寸，則加入到提示中
     original_video_info = ""
@@ -337,6 +393,7 @@ def analyze_video_with_llm(video_path, conversation_history, original_width=None
             messages=messages,
             response_format={"type": "json_object"},
             temperature=0.3,
+            timeout=config.LLM_TIMEOUT_SECONDS,
         )
         response_content = response.choices[0].message.content
         print("✅ LLM分析成功")
@@ -345,93 +402,128 @@ def analyze_video_with_llm(video_path, conversation_history, original_width=None
         print(f"❌ LLM分析失敗: {e}")
         return None
 
-def extract_frames_from_video(video_path, max_frames=5, attempt=1):
-    """從影片中提取幀，支援多次嘗試以獲得不同的幀"""
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        return []
+def extract_frames_from_video(video_path, max_frames=5, attempt=1, access_mode=ACCESS_FAST):
+    """從影片中提取幀，支援多次嘗試以獲得不同的幀（LLM 分析不需精確幀，預設使用快速存取）"""
+    with decoder_session(video_path) as (cap, meta):
+        if cap is None:
+            return []
 
-    base64_frames = []
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    
-    if total_frames <= 0:
-        cap.release()
-        return []
-    
-    # 根據嘗試次數調整幀提取策略
-    if attempt == 1:
-        # 第一次嘗試：均勻分佈
-        frame_interval = max(1, total_frames // max_frames)
-        start_offset = 0
-    elif attempt == 2:
-        # 第二次嘗試：從影片中間開始
-        frame_interval = max(1, total_frames // (max_frames * 2))
-        start_offset = total_frames // 4
-    else:
-        # 第三次嘗試：隨機選擇幀
-        import random
-        frame_indices = random.sample(range(total_frames), min(max_frames, total_frames))
-        frame_indices.sort()
+        base64_frames = []
+        total_frames = meta['frame_count']
         
-        for frame_idx in frame_indices:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            if ret:
-                _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, config.DEFAULT_JPEG_QUALITY])
-                base64_frames.append(base64.b64encode(buffer).decode("utf-8"))
+        if total_frames <= 0:
+            return []
         
-        cap.release()
-        return base64_frames
-    
-    # 標準提取邏輯（第一次和第二次嘗試）
-    count = 0
-    for i in range(start_offset, total_frames, frame_interval):
-        if count >= max_frames:
-            break
-        cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-        ret, frame = cap.read()
-        if ret:
+        # 根據嘗試次數調整幀提取策略
+        if attempt == 1:
+            # 第一次嘗試：均勻分佈
+            frame_interval = max(1, total_frames // max_frames)
+            frame_indices = list(range(0, total_frames, frame_interval))[:max_frames]
+        elif attempt == 2:
+            # 第二次嘗試：從影片中間開始
+            frame_interval = max(1, total_frames // (max_frames * 2))
+            frame_indices = list(range(total_frames // 4, total_frames, frame_interval))[:max_frames]
+        else:
+            # 第三次嘗試：隨機選擇幀
+            import random
+            frame_indices = random.sample(range(total_frames), min(max_frames, total_frames))
+            frame_indices.sort()
+        
+        keyframes = get_keyframe_frames(video_path)
+        for _, frame in read_frames(cap, meta, frame_indices, mode=access_mode, keyframes=keyframes):
             _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, config.DEFAULT_JPEG_QUALITY])
             base64_frames.append(base64.b64encode(buffer).decode("utf-8"))
-            count += 1
     
-    cap.release()
     return base64_frames
 
-def crop_frame_for_thumbnail(video_path, box):
-    """從影片中間幀裁切一個區域作為縮圖"""
+def _encode_thumbnail_crop(frame, box, quality=None, inline=True, mimetype='image/jpeg'):
+    """裁切單一區域並編碼為縮圖（inline 時為 data URI，否則為預覽資源 URL）"""
+    if quality is None:
+        quality = config.PREVIEW_IMAGE_QUALITY['thumbnail']
+    x1, y1, x2, y2 = [int(v) for v in box]
+    cropped_frame = frame[y1:y2, x1:x2]
+    
+    # 檢查裁切後的影格是否有效
+    if cropped_frame.size == 0:
+        print(f"⚠️ 裁切區域無效: {box}, 導致縮圖生成失敗。")
+        return None
+    
+    return publish_image(cropped_frame, quality=quality, inline=inline, mimetype=mimetype)
+
+def crop_frames_for_thumbnails(video_path, boxes, inline=True, mimetype='image/jpeg'):
+    """只解碼一次中間幀，裁切多個區域並平行編碼為縮圖，返回與 boxes 對應的列表"""
+    if not boxes:
+        return []
     try:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            return None
-        
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         # Seek to middle frame, which is usually representative
-        cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames // 2)
-        ret, frame = cap.read()
-        cap.release()
-        
-        if not ret:
-            return None
+        # 縮圖以原始影片裁切（不使用代理影片），保留主體框的原始解析度
+        frame = read_middle_frame(video_path)
+        if frame is None:
+            return [None] * len(boxes)
         
-        # 進行裁切
-        x1, y1, x2, y2 = box
-        cropped_frame = frame[y1:y2, x1:x2]
+        if len(boxes) == 1:
+            return [_encode_thumbnail_crop(frame, boxes[0], inline=inline, mimetype=mimetype)]
         
-        # 檢查裁切後的影格是否有效
-        if cropped_frame.size == 0:
-            print(f"⚠️ 裁切區域無效: {box}, 導致縮圖生成失敗。")
-            return None
-
-        _, buffer = cv2.imencode(".jpg", cropped_frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-        return f"data:image/jpeg;base64,{base64.b64encode(buffer).decode('utf-8')}"
+        # cv2.imencode 會釋放 GIL，多個主體時以執行緒平行編碼
+        workers = min(len(boxes), config.THUMBNAIL_ENCODE_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda box: _encode_thumbnail_crop(frame, box, inline=inline, mimetype=mimetype), boxes))
     except Exception as e:
         print(f"❌ 為縮圖裁切幀時發生錯誤: {e}")
-        return None
+        return [None] * len(boxes)
+
+def _write_converted_clip(final_clip, output_path):
+    """以 libx264/aac 寫出轉換後的影片"""
+    temp_audio_filename = f"temp-audio-{uuid.uuid4()}.m4a"
+    temp_audio_path = os.path.join(os.path.dirname(output_path), temp_audio_filename)
+
+    print(f"✍️ MoviePy: 開始寫入輸出檔案至 {output_path}")
+    final_clip.write_videofile(
+        str(output_path),
+        codec='libx264', audio_codec='aac',
+        temp_audiofile=str(temp_audio_path),
+        remove_temp=True,
+        verbose=False,
+        logger=None
+    )
+    print("✅ MoviePy: 檔案寫入完成。")
+
+def _build_static_crop_clip(clip, input_path, target_width, target_height, crop_mode, manual_center):
+    """以單一中心點建立縮放並裁切後的片段，返回 (final_clip, resized_clip)"""
+    crop_center = (clip.w / 2, clip.h / 2)
+
+    if manual_center:
+        print(f"🧠 使用手動選擇的中心點: {manual_center}")
+        crop_center = manual_center
+    elif crop_mode == 'face':
+        print("🧠 MoviePy: 啟用AI人臉辨識...")
+        ai_center = analyze_video_for_face_crop(input_path)
+        if ai_center is not None:
+            crop_center = ai_center
+    
+    print("📏 MoviePy: 計算縮放與裁切參數...")
+    
+    # 只需數值計算即可規劃裁切，不必解碼任何幀；以 MoviePy 實際縮放後的尺寸限制中心點
+    scale = crop_scale(clip.w, clip.h, target_width, target_height)
+    resized_clip = clip.resize(scale)
+    plan = plan_crops(clip.w, clip.h, [(target_width, target_height)], [crop_center], scaled_sizes=[resized_clip.size])
+    x1, y1, x2, y2 = plan['target_rects'][0, 0]
+    final_crop_x, final_crop_y = (x1 + x2) / 2, (y1 + y2) / 2
+    
+    if plan['is_adjusted'][0, 0]:
+        desired_center_x, desired_center_y = crop_center[0] * scale, crop_center[1] * scale
+        print(f"⚠️ 裁切中心點已調整以避免超出邊界。")
+        print(f"   原始中心: ({desired_center_x:.0f}, {desired_center_y:.0f}) -> 調整後: ({final_crop_x:.0f}, {final_crop_y:.0f})")
+    
+    final_clip = resized_clip.crop(
+        x_center=final_crop_x, y_center=final_crop_y,
+        width=target_width, height=target_height
+    )
 
-def perform_video_conversion(input_path, output_path, target_width, target_height, crop_mode='center', manual_center=None):
-    """核心轉換函式"""
+    return final_clip, resized_clip
+
+def perform_video_conversion(input_path, output_path, target_width, target_height, crop_mode='center', manual_center=None, center_track=None):
+    """核心轉換函式，center_track 為每幀中心點陣列時使用動態裁切"""
     try:
         if not MOVIEPY_AVAILABLE:
             print("MoviePy 不可用，執行檔案複製。")
@@ -441,81 +533,29 @@ def perform_video_conversion(input_path, output_path, target_width, target_heigh
         print(f"▶️ MoviePy: 開始轉換，輸出至: {output_path}")
             
         with VideoFileClip(input_path) as clip:
-            crop_center = (clip.w / 2, clip.h / 2)
-
-            if manual_center:
-                print(f"🧠 使用手動選擇的中心點: {manual_center}")
-                crop_center = manual_center
-            elif crop_mode == 'face':
-                print("🧠 MoviePy: 啟用AI人臉辨識...")
-                ai_center = analyze_video_for_face_crop(input_path)
-                if ai_center is not None:
-                    crop_center = ai_center
-            
-            print("📏 MoviePy: 計算縮放與裁切參數...")
-            
-            # 使用共用的智慧裁切邏輯
-            # 先從影片中提取一幀來計算裁切參數
-            cap = cv2.VideoCapture(input_path)
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            ret, frame = cap.read()
-            cap.release()
-            
-            if ret:
-                # 使用共用裁切函數計算參數
-                _, is_adjusted = apply_smart_crop(
-                    frame, target_width, target_height, crop_center,
-                    original_width=clip.w, original_height=clip.h
-                )
-                
-                # 計算MoviePy需要的裁切參數
-                scale = max(target_width / clip.w, target_height / clip.h)
+            if center_track is not None and len(center_track) > 0:
+                print(f"🎯 MoviePy: 使用每幀中心點進行動態裁切 ({len(center_track)} 幀)")
+                scale = crop_scale(clip.w, clip.h, target_width, target_height)
                 resized_clip = clip.resize(scale)
-                
-                # 重新計算裁切中心點（與apply_smart_crop相同的邏輯）
-                desired_center_x = crop_center[0] * scale
-                desired_center_y = crop_center[1] * scale
-                
-                half_w = target_width / 2
-                half_h = target_height / 2
-                min_x = half_w
-                max_x = resized_clip.w - half_w
-                min_y = half_h
-                max_y = resized_clip.h - half_h
-                
-                final_crop_x = max(min_x, min(desired_center_x, max_x))
-                final_crop_y = max(min_y, min(desired_center_y, max_y))
-                
-                if is_adjusted:
-                    print(f"⚠️ 裁切中心點已調整以避免超出邊界。")
-                    print(f"   原始中心: ({desired_center_x:.0f}, {desired_center_y:.0f}) -> 調整後: ({final_crop_x:.0f}, {final_crop_y:.0f})")
-                
-                final_clip = resized_clip.crop(
-                    x_center=final_crop_x, y_center=final_crop_y,
-                    width=target_width, height=target_height
+                offsets = compute_dynamic_crop_offsets(
+                    center_track, clip.w, clip.h, target_width, target_height,
+                    resized_size=resized_clip.size
                 )
+                fps = clip.fps or 30
+                last_index = len(offsets) - 1
+
+                def crop_at_time(get_frame, t):
+                    frame = get_frame(t)
+                    x, y = offsets[min(int(t * fps), last_index)]
+                    return frame[y:y + target_height, x:x + target_width]
+
+                final_clip = resized_clip.fl(crop_at_time, apply_to=[])
             else:
-                # 如果無法讀取幀，使用原始邏輯
-                scale = max(target_width / clip.w, target_height / clip.h)
-                resized_clip = clip.resize(scale)
-                final_clip = resized_clip.crop(
-                    x_center=resized_clip.w / 2, y_center=resized_clip.h / 2,
-                    width=target_width, height=target_height
+                final_clip, resized_clip = _build_static_crop_clip(
+                    clip, input_path, target_width, target_height, crop_mode, manual_center
                 )
-            
-            temp_audio_filename = f"temp-audio-{uuid.uuid4()}.m4a"
-            temp_audio_path = os.path.join(os.path.dirname(output_path), temp_audio_filename)
-
-            print(f"✍️ MoviePy: 開始寫入輸出檔案至 {output_path}")
-            final_clip.write_videofile(
-                str(output_path),
-                codec='libx264', audio_codec='aac',
-                temp_audiofile=str(temp_audio_path),
-                remove_temp=True,
-                verbose=False,
-                logger=None
-            )
-            print("✅ MoviePy: 檔案寫入完成。")
+
+            _write_converted_clip(final_clip, output_path)
             
             final_clip.close()
             resized_clip.close()